@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Benchmark every stage of the lightPainting and multiDroneFormation pipelines on synthetic images.
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py -o results.json --baseline baseline.json
+
+Each stage is timed on its own (best of --repeat runs) and then run once more under tracemalloc
+to record its peak traced memory (NumPy and Python allocations, not OpenCV's internal buffers).
+With --baseline, the results are compared stage by stage and the exit code is 1 if any stage got
+slower than --tolerance times its baseline time.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', 'src'))
+
+from crazyKhoreia.lightPainting import lightPainting  # noqa: E402
+from crazyKhoreia.multiDroneFormation import multiDroneFormation  # noqa: E402
+from crazyKhoreia._barePipeline import bare  # noqa: E402
+
+KINDS = ('shapes', 'text', 'noise')
+RESOLUTIONS = (512, 2048, 4096)
+NUM_DRONES = (10, 100, 1000, 5000)
+QUICK_RESOLUTIONS = (512,)
+QUICK_NUM_DRONES = (10, 100)
+BOX_SHAPE = np.array([0.3, 0.3, 0.3])
+
+
+def synthetic_image(kind, size, seed=0):
+    """ Deterministic black on white test image: random shapes, text lines or thresholded smooth noise.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full(shape=(size, size, 3), fill_value=255, dtype=np.uint8)
+    s = size/512
+
+    if kind == 'shapes':
+        for k in range(24):
+            c = tuple(int(v) for v in rng.integers(0, size, 2))
+            r = int(rng.integers(10, 60)*s)
+            t = max(1, int(3*s))
+            if k % 3 == 0:
+                cv.circle(img, c, r, (0, 0, 0), t)
+            elif k % 3 == 1:
+                cv.rectangle(img, c, (c[0] + r, c[1] + r), (0, 0, 0), t)
+            else:
+                pts = rng.integers(-r, r, size=(5, 2)) + c
+                cv.polylines(img, [pts.astype(np.int32)], True, (0, 0, 0), t)
+    elif kind == 'text':
+        for k in range(8):
+            cv.putText(img, 'crazyKhoreia ' + str(k), (int(10*s), int((k + 1)*60*s)),
+                       cv.FONT_HERSHEY_SIMPLEX, 1.4*s, (0, 0, 0), max(1, int(3*s)))
+    elif kind == 'noise':
+        noise = rng.random(size=(max(8, size//32), max(8, size//32)))
+        noise = cv.resize(noise, (size, size), interpolation=cv.INTER_CUBIC)
+        img[noise > 0.6] = 0
+    else:
+        raise ValueError("Unknown image kind: " + str(kind))
+
+    return img
+
+
+def flight_space(num_drones):
+    """ Flight space that fits num_drones UAVs, grows with the swarm so large formations remain feasible.
+    """
+    side = max(3.0, 0.6*np.sqrt(num_drones))
+
+    return np.array([[-side/2, -side/2, 0.0], [side/2, side/2, side]])
+
+
+def read_image(o):
+    o.img = o.read_image()
+
+
+def process_image(o):
+    o.contours = o.process_image()
+
+
+def process_contours(o):
+    o.cnt_points, o.cnt_offsets = o.process_contours(o.contours)
+
+
+def lp_waypoints(o):
+    o.wpts = o.get_waypoints()
+
+
+def clean_waypoints(o):
+    o.clean_waypoints()
+
+
+def calculate_stats(o):
+    o.distance, o.Time = o.calculate_stats()
+
+
+def mdf_waypoints(o):
+    o.wayPoints = o.get_waypoints()
+
+
+def initial_grid(o):
+    o.initialGrid = o.estimateInitialGrid()
+
+
+def clustering(o):
+    o.idealPositions = o.get_idealPositions(o.get_clusters(o.wayPoints))
+
+
+def iou_resolution(o):
+    o.adjustedPositions = o.getIoUsppd()
+    o.centerPositions()
+
+
+def assignment(o):
+    o.droneAssignments = o.dronePositionAssignment()
+
+
+def transition_check(o):
+    o.conflicts, o.conflictTimes, o.startDelays = o.check_transition()
+
+
+LIGHT_PAINTING_STAGES = [('read_image', read_image), ('process_image', process_image),
+                         ('process_contours', process_contours), ('get_waypoints', lp_waypoints),
+                         ('clean_waypoints', clean_waypoints), ('calculate_stats', calculate_stats)]
+FORMATION_STAGES = [('get_waypoints', mdf_waypoints), ('estimateInitialGrid', initial_grid),
+                    ('get_clusters', clustering), ('getIoUsppd', iou_resolution),
+                    ('dronePositionAssignment', assignment), ('check_transition', transition_check)]
+
+
+def measure(obj, stage, fn, repeat):
+    """ Time fn(obj) and record its peak memory, restoring obj's attributes before every run.
+    """
+    snapshot = dict(obj.__dict__)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for r in range(repeat):
+            obj.__dict__.clear()
+            obj.__dict__.update(snapshot)
+            start = time.perf_counter()
+            fn(obj)
+            times.append(time.perf_counter() - start)
+
+        obj.__dict__.clear()
+        obj.__dict__.update(snapshot)
+        tracemalloc.start()
+        fn(obj)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return dict(stage=stage, time=min(times), peak_bytes=peak)
+
+
+def light_painting_cases(kinds, resolutions, repeat, tmp):
+    dims = flight_space(1)
+    for kind in kinds:
+        for size in resolutions:
+            path = os.path.join(tmp, kind + '_' + str(size) + '.png')
+            cv.imwrite(path, synthetic_image(kind, size))
+
+            lp = bare(lightPainting, dims=dims, in_path=path, out_path=tmp, detail=0.05,
+                      speed=1.0, sleepTime=1.5)
+            case = 'lightPainting/' + kind + '/' + str(size)
+            for stage, fn in LIGHT_PAINTING_STAGES:
+                result = measure(lp, stage, fn, repeat)
+                result.update(case=case, points=int(len(lp.cnt_points)) if hasattr(
+                    lp, 'cnt_points') else None)
+                yield result
+
+
+def formation_cases(kinds, num_drones, repeat, tmp, cluster_engine='kmeans', size=2048):
+    for kind in kinds:
+        path = os.path.join(tmp, kind + '_' + str(size) + '.png')
+        cv.imwrite(path, synthetic_image(kind, size))
+        img = cv.imread(path, cv.IMREAD_UNCHANGED)
+
+        for n in num_drones:
+            dims = flight_space(n)
+            mdf = bare(multiDroneFormation, dims=dims, in_path=path, out_path=tmp, num_drones=n,
+                       boxShape=BOX_SHAPE, cluster_engine=cluster_engine, img=img)
+            mdf.contours = mdf.process_image()
+            mdf.cnt_points, mdf.cnt_offsets = mdf.process_contours(
+                mdf.contours)
+            if len(mdf.cnt_points) < n:
+                continue
+
+            case = 'multiDroneFormation/' + kind + '/' + \
+                str(n) + '/' + cluster_engine
+            for stage, fn in FORMATION_STAGES:
+                result = measure(mdf, stage, fn, repeat)
+                result.update(case=case, points=int(len(mdf.cnt_points)))
+                yield result
+
+
+def compare(results, baseline, tolerance):
+    """ Print every stage's time against the baseline and return the list of regressions.
+    """
+    reference = {(r['case'], r['stage']): r for r in baseline['results']}
+    regressions = []
+
+    print("\n" + "case".ljust(44) + "stage".ljust(26) +
+          "time [s]".rjust(12) + "baseline".rjust(12) + "ratio".rjust(8))
+    for r in results:
+        ref = reference.get((r['case'], r['stage']))
+        if ref is None:
+            continue
+        ratio = r['time']/max(ref['time'], 1e-9)
+        flag = ''
+        if ratio > tolerance and r['time'] - ref['time'] > 1e-3:
+            regressions.append((r['case'], r['stage'], ratio))
+            flag = '  <- slower'
+        print(r['case'].ljust(44) + r['stage'].ljust(26) + ('%.4f' % r['time']).rjust(12) +
+              ('%.4f' % ref['time']).rjust(12) + ('%.2f' % ratio).rjust(8) + flag)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crazyKhoreia pipeline stages on synthetic images.")
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help="JSON results file.")
+    parser.add_argument('--baseline', default=None,
+                        help="JSON results of a previous run to compare against.")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="Slowdown ratio against the baseline reported as a regression.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Timed runs per stage, the best one is kept.")
+    parser.add_argument('--quick', action='store_true',
+                        help="Small resolutions and swarms only.")
+    parser.add_argument('--kinds', nargs='+', default=list(KINDS), choices=KINDS)
+    parser.add_argument('--resolutions', type=int, nargs='+', default=None)
+    parser.add_argument('--num_drones', type=int, nargs='+', default=None)
+    parser.add_argument('--cluster_engine', default='kmeans',
+                        choices=['kmeans', 'minibatch', 'subsample', 'arclength'])
+    args = parser.parse_args(argv)
+
+    resolutions = args.resolutions or (
+        QUICK_RESOLUTIONS if args.quick else RESOLUTIONS)
+    num_drones = args.num_drones or (
+        QUICK_NUM_DRONES if args.quick else NUM_DRONES)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = os.path.join(tmp, '')
+        for result in list(light_painting_cases(args.kinds, resolutions, args.repeat, tmp)) + \
+                list(formation_cases(args.kinds, num_drones, args.repeat, tmp, args.cluster_engine)):
+            print(result['case'].ljust(44) + result['stage'].ljust(26) +
+                  ('%.4f s' % result['time']).rjust(12) + ('%.1f MB' % (result['peak_bytes']/2**20)).rjust(12))
+            results.append(result)
+
+    import scipy
+    import sklearn
+    meta = dict(date=datetime.datetime.now().isoformat(), python=platform.python_version(),
+                platform=platform.platform(), cpus=os.cpu_count(), numpy=np.__version__,
+                opencv=cv.__version__, scipy=scipy.__version__, sklearn=sklearn.__version__,
+                repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(dict(meta=meta, results=results), f, indent=1)
+    print("Results saved to " + args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(str(len(regressions)) + " stages slower than " +
+                  str(args.tolerance) + "x their baseline.")
+            return 1
+        print("No regressions against the baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
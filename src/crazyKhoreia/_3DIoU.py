@@ -5,7 +5,6 @@
 
 import numpy as np
 from scipy.spatial import ConvexHull
-from numpy import *
 
 
 class _3DIoU():
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from crazyKhoreia._batchIoU import candidate_pairs, pair_iou
+
+
+class _IoUTable():
+    """ Persistent pair table of the IoU between a set of equally sized, axis-aligned 3D boxes.
+    Attributes:
+        centers     (array):    N x 3 float array with the current box centers.
+        boxShape    (array):    1x3 float array with the box size (length (X axis), wide (Y axis), height (Z axis)).
+        pairs       (list):     Per box dict mapping each overlapping box index to their IoU.
+        UAV_IoU     (array):    Per box accumulated IoU against the rest of the boxes.
+
+    Methods:
+        move(i, delta):
+            Move box i by delta and only update the pairs that involve it.
+        neighbours(i):
+            Return the indices of the boxes that can overlap box i.
+    """
+
+    def __init__(self, centers, boxShape):
+        self.centers = np.array(centers, dtype=float)
+        self.boxShape = np.asarray(boxShape, dtype=float)
+        num_boxes = len(self.centers)
+
+        # Uniform grid with one box size per cell, two boxes can only overlap if
+        # they lie within neighbouring cells.
+        self.cells = np.floor(self.centers/self.boxShape).astype(int)
+        self.grid = {}
+        for i, cell in enumerate(map(tuple, self.cells)):
+            self.grid.setdefault(cell, set()).add(i)
+
+        # Fill the pair table from the broad phase.
+        self.pairs = [dict() for i in range(num_boxes)]
+        combs = candidate_pairs(self.centers, self.boxShape)
+        IoU = pair_iou(self.centers[combs[:, 0]], self.centers[combs[:, 1]],
+                       self.boxShape, self.boxShape)
+        for (i, j), value in zip(combs[IoU > 0].tolist(), IoU[IoU > 0].tolist()):
+            self.pairs[i][j] = value
+            self.pairs[j][i] = value
+
+        self.UAV_IoU = np.array([sum(pair.values()) for pair in self.pairs])
+
+    def neighbours(self, i):
+        x, y, z = self.cells[i]
+        nbrs = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    nbrs.extend(self.grid.get((x + dx, y + dy, z + dz), ()))
+        nbrs.remove(i)
+
+        return np.array(nbrs, dtype=int)
+
+    def move(self, i, delta):
+        # Drop the pairs of the box before moving it.
+        affected = set(self.pairs[i])
+        for j in affected:
+            del self.pairs[j][i]
+
+        # Move the box and update its grid cell.
+        self.centers[i] += delta
+        cell = np.floor(self.centers[i]/self.boxShape).astype(int)
+        if tuple(cell) != tuple(self.cells[i]):
+            self.grid[tuple(self.cells[i])].discard(i)
+            self.cells[i] = cell
+            self.grid.setdefault(tuple(cell), set()).add(i)
+
+        # Evaluate the box against its new neighbours only.
+        nbrs = self.neighbours(i)
+        IoU = pair_iou(self.centers[i], self.centers[nbrs],
+                       self.boxShape, self.boxShape)
+        self.pairs[i] = dict(zip(nbrs[IoU > 0].tolist(), IoU[IoU > 0].tolist()))
+        for j, value in self.pairs[i].items():
+            self.pairs[j][i] = value
+        affected.update(self.pairs[i])
+        affected.add(i)
+
+        # Sum the accumulators again instead of subtracting, so no rounding residue is left behind.
+        for j in affected:
+            self.UAV_IoU[j] = sum(self.pairs[j].values())
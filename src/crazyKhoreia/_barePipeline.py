@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import inspect
+
+import numpy as np
+
+from crazyKhoreia.stageProfiler import NULL_PROFILER
+
+
+def constructor_defaults(cls):
+    """ Default value of every constructor parameter of a pipeline class and its parents, the child's first.
+    """
+    defaults = {}
+    for base in reversed(cls.__mro__[:-1]):
+        if '__init__' in vars(base):
+            defaults.update({k: v.default for k, v in inspect.signature(base.__init__).parameters.items()
+                             if v.default is not inspect.Parameter.empty})
+
+    return defaults
+
+
+def bare(cls, **attrs):
+    """ Pipeline object without running its constructor, so every stage can be called on its own.
+    Unset attributes take the constructor defaults, without figures, cache or profiling.
+    """
+    obj = cls.__new__(cls)
+    obj.__dict__.update(constructor_defaults(cls))
+    obj.headless, obj.cache, obj.profiler = True, None, NULL_PROFILER
+    obj.__dict__.update(attrs)
+    obj.dims = np.array(obj.dims)
+    if getattr(obj, 'boxShape', None) is not None:
+        obj.boxShape = np.array(obj.boxShape)
+
+    return obj
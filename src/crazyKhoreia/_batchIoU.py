@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from crazyKhoreia._3DIoU import _3DIoU
+
+
+def pair_overlap(centers1, centers2, shapes1, shapes2):
+    """ Closed-form overlap volume between axis-aligned 3D boxes.
+    Input:
+        centers1, centers2: (..., 3) arrays of box centers (x, y, z).
+        shapes1, shapes2: (..., 3) arrays of box sizes (length (X axis), wide (Y axis), height (Z axis)).
+        All inputs are broadcast against each other.
+    Output:
+        inter_vol: (...) array with the intersection volume of each pair of boxes.
+    """
+    half1 = np.asarray(shapes1, dtype=float)/2
+    half2 = np.asarray(shapes2, dtype=float)/2
+    centers1 = np.asarray(centers1, dtype=float)
+    centers2 = np.asarray(centers2, dtype=float)
+
+    # Overlap along each axis, the boxes only intersect if all of them are positive.
+    inter_vol = 1.0
+    for k in range(3):
+        upper = np.minimum(centers1[..., k] + half1[..., k],
+                           centers2[..., k] + half2[..., k])
+        lower = np.maximum(centers1[..., k] - half1[..., k],
+                           centers2[..., k] - half2[..., k])
+        inter_vol = inter_vol*np.maximum(0.0, upper - lower)
+
+    return inter_vol
+
+
+def pair_iou(centers1, centers2, shapes1, shapes2):
+    """ Closed-form 3D IoU between axis-aligned boxes, see pair_overlap() for the inputs.
+    """
+    inter_vol = pair_overlap(centers1, centers2, shapes1, shapes2)
+    vol1 = np.prod(np.asarray(shapes1, dtype=float), axis=-1)
+    vol2 = np.prod(np.asarray(shapes2, dtype=float), axis=-1)
+
+    return inter_vol/(vol1 + vol2 - inter_vol)
+
+
+def candidate_pairs(centers, boxShape):
+    """ Broad phase, find the pairs of boxes that can overlap.
+    Input:
+        centers: (N,3) array of box centers (x, y, z).
+        boxShape: (3,) box size shared by every box or (N,3) array with one box size per center.
+    Output:
+        pairs: (M,2) int array of index pairs (i < j) whose centers are closer than one box size
+               along every axis, any other pair has a zero overlap.
+    """
+    centers = np.asarray(centers, dtype=float)
+    shapes = np.broadcast_to(np.asarray(boxShape, dtype=float), centers.shape)
+
+    if len(centers) < 2:
+        return np.empty(shape=(0, 2), dtype=int)
+
+    # Normalize each axis by the largest box size, so that two boxes can only
+    # overlap if their Chebyshev distance is lower than one.
+    size = np.max(shapes, axis=0)
+    tree = cKDTree(centers/size)
+    pairs = tree.query_pairs(r=1.0, p=np.inf, output_type='ndarray')
+
+    return pairs.reshape(-1, 2)
+
+
+def iou_matrix(centers, boxShape, heading_angle=0.0, volume=False):
+    """ Compute the full N x N 3D IoU (or overlap volume) matrix of a set of boxes in one call.
+    Input:
+        centers: (N,3) array of box centers (x, y, z).
+        boxShape: (3,) box size shared by every box or (N,3) array with one box size per center.
+        heading_angle: rad scalar, clockwise from pos x axis, shared by every box.
+        volume: if set, return the intersection volume instead of the IoU.
+    Output:
+        matrix: (N,N) symmetric array, the diagonal is set to zero.
+    Note:
+        Axis-aligned boxes (heading_angle == 0) are solved in closed form, any other
+        heading falls back to the _3DIoU reference implementation, pair by pair.
+    """
+    centers = np.asarray(centers, dtype=float)
+    shapes = np.broadcast_to(np.asarray(boxShape, dtype=float), centers.shape)
+    num_boxes = len(centers)
+
+    if heading_angle == 0:
+        matrix = pair_overlap(centers[:, None, :], centers[None, :, :],
+                              shapes[:, None, :], shapes[None, :, :])
+        if not volume:
+            vols = np.prod(shapes, axis=1)
+            matrix = matrix/(vols[:, None] + vols[None, :] - matrix)
+    else:
+        matrix = np.zeros(shape=(num_boxes, num_boxes))
+        for i in range(num_boxes):
+            for j in range(i + 1, num_boxes):
+                IoU = _3DIoU([shapes[i], heading_angle, centers[i]],
+                             [shapes[j], heading_angle, centers[j]])
+                if volume:
+                    value = IoU.IOU_3d*(np.prod(shapes[i]) + np.prod(shapes[j])) / \
+                        (1 + IoU.IOU_3d)
+                else:
+                    value = IoU.IOU_3d
+                matrix[i][j] = matrix[j][i] = value
+
+    np.fill_diagonal(matrix, 0.0)
+
+    return matrix
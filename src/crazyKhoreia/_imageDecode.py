@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import struct
+
+import cv2 as cv
+import numpy as np
+
+# Pixels per row strip, bounds the temporary buffers of the per-strip operations.
+STRIP_PIXELS = 1 << 22
+
+REDUCED_COLOR = {2: cv.IMREAD_REDUCED_COLOR_2,
+                 4: cv.IMREAD_REDUCED_COLOR_4, 8: cv.IMREAD_REDUCED_COLOR_8}
+
+# Like IMREAD_UNCHANGED (the full size path), the EXIF orientation is ignored, so the header size holds.
+IGNORE_ORIENTATION = cv.IMREAD_IGNORE_ORIENTATION
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def image_info(path):
+    """ Read the image size from the file header, without decoding it.
+    Output:
+        (width, height, has_alpha) for PNG and JPEG files, else None.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        if head == PNG_SIGNATURE:
+            return _png_info(f)
+        if head[:2] == b'\xff\xd8':
+            f.seek(2)
+            return _jpeg_info(f)
+
+    return None
+
+
+def _png_info(f):
+    length, kind = struct.unpack('>I4s', f.read(8))
+    if kind != b'IHDR':
+        return None
+    width, height, depth, color_type = struct.unpack('>IIBB', f.read(10))
+    f.seek(length - 10 + 4, 1)
+
+    # Color types 4 and 6 carry an alpha channel, a tRNS chunk before the image data adds one.
+    has_alpha = color_type in (4, 6)
+    while(not has_alpha):
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        length, kind = struct.unpack('>I4s', chunk)
+        if kind in (b'IDAT', b'IEND'):
+            break
+        has_alpha = kind == b'tRNS'
+        f.seek(length + 4, 1)
+
+    return width, height, has_alpha
+
+
+def _jpeg_info(f):
+    while(1):
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        if marker[1] in (0xd8, 0x01) or 0xd0 <= marker[1] <= 0xd7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+
+        # Start of frame markers, except DHT (c4), JPG (c8) and DAC (cc).
+        if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height, False
+        f.seek(length - 2, 1)
+
+
+def working_factor(width, height, dims, resolution):
+    """ Integer reduction factor so a pixel stays under a quarter of resolution once the image is scaled to dims.
+    """
+    pixel = max((dims[1][1] - dims[0][1])/width,
+                (dims[1][2] - dims[0][2])/height)
+
+    return max(1, int(resolution/4/pixel))
+
+
+def composite(img, factor=1):
+    """ Fill the transparent background of a BGRA image in white and reduce it by factor (INTER_AREA),
+    one row strip at a time so no full size temporary buffer is allocated.
+    """
+    height, width = img.shape[0]//factor*factor, img.shape[1]//factor*factor
+    out = np.empty(shape=(height//factor, width//factor, 3), dtype=np.uint8)
+    rows = max(1, STRIP_PIXELS//max(width, 1)//factor)*factor
+    bg = np.array([255, 255, 255])
+
+    for r in range(0, height, rows):
+        strip = img[r:min(r + rows, height), :width]
+        if strip.shape[2] == 4:
+            alpha = (strip[:, :, 3]/255).reshape(strip.shape[:2] + (1,))
+            strip = ((bg * (1 - alpha)) +
+                     (strip[:, :, :3] * alpha)).astype(np.uint8)
+        if factor > 1:
+            strip = cv.resize(strip, (width//factor, strip.shape[0]//factor),
+                              interpolation=cv.INTER_AREA)
+        out[r//factor:r//factor + strip.shape[0]] = strip
+
+    return out
+
+
+def decode_plan(path, dims, resolution):
+    """ Choose how read_reduced() decodes an image.
+    Only the JPEG decoder reduces an image while decoding it (DCT scaling). OpenCV decodes PNG and every
+    other format at full size before any reduction, even with the IMREAD_REDUCED_* flags, and transparent
+    images are read at full size to be composited.
+    Output:
+        factor: reduction factor, see working_factor().
+        flags: cv.imread flags.
+        denom: reduction applied by the decoder (1, 2, 4 or 8), the rest of the factor is applied afterwards.
+        full_size: whether the image is held in memory at full size while decoding.
+    """
+    info = image_info(path)
+    factor = 1 if info is None else working_factor(
+        info[0], info[1], dims, resolution)
+    if factor == 1 or info[2]:
+        return factor, cv.IMREAD_UNCHANGED, 1, True
+
+    denom = max(d for d in (1, 2, 4, 8) if d <= factor)
+    flags = (REDUCED_COLOR[denom] if denom > 1 else cv.IMREAD_COLOR) | IGNORE_ORIENTATION
+    with open(path, 'rb') as f:
+        full_size = f.read(2) != b'\xff\xd8'
+
+    return factor, flags, denom, full_size
+
+
+def read_reduced(path, dims, resolution):
+    """ Decode an image at the working resolution of dims and resolution, see working_factor().
+    Opaque JPEG files are reduced by the decoder itself and never held in memory at full size. PNG files
+    and transparent images are decoded at full size first (a warning is printed when they are larger than
+    the working resolution), then reduced, transparent ones composited and reduced by row strips.
+    """
+    factor, flags, denom, full_size = decode_plan(path, dims, resolution)
+    if factor > 1 and full_size == True:
+        width, height, has_alpha = image_info(path)
+        print("Warning: " + path + " (" + str(width) + "x" + str(height) + ") is decoded at full size, about " +
+              str(round(width*height*(4 if has_alpha else 3)/2**20)) + " MB, before its reduction by " + str(factor) +
+              ", only opaque JPEG files are reduced while decoding.")
+
+    img = cv.imread(path, flags)
+    if factor == 1:
+        return img
+    if flags == cv.IMREAD_UNCHANGED:
+        return composite(img, factor)
+
+    if factor > denom:
+        img = cv.resize(img, (max(1, img.shape[1]*denom//factor), max(1, img.shape[0]*denom//factor)),
+                        interpolation=cv.INTER_AREA)
+
+    return img
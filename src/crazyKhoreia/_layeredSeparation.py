@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from crazyKhoreia._batchIoU import candidate_pairs, pair_iou
+
+
+def overlap_edges(centers, boxShape):
+    """ Edges of the overlap graph, both directions of every pair of overlapping boxes.
+    Output:
+        u, v: int arrays, box u[k] overlaps box v[k].
+    """
+    pairs = candidate_pairs(centers, boxShape)
+    IoU = pair_iou(centers[pairs[:, 0]], centers[pairs[:, 1]],
+                   boxShape, boxShape)
+    pairs = pairs[IoU > 0]
+
+    return np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]])
+
+
+def color_layers(num_boxes, u, v, seed=0):
+    """ Parallel greedy coloring (Jones-Plassmann), on each round every uncolored box that outranks its
+    uncolored neighbours takes the smallest layer unused by its colored neighbours. Those boxes are never
+    adjacent, so a whole round is colored at once. Boxes with more overlaps rank first, which keeps the
+    number of layers low.
+    Output:
+        layers: (N,) int array, overlapping boxes always get different layers.
+        rounds: number of rounds.
+    """
+    degree = np.bincount(u, minlength=num_boxes)
+    tie = np.random.default_rng(seed).permutation(num_boxes)
+    rank = np.empty(shape=(num_boxes,), dtype=int)
+    rank[np.lexsort((tie, degree))] = np.arange(num_boxes)
+
+    layers = np.full(shape=(num_boxes,), fill_value=-1)
+    rounds = 0
+    while(np.any(layers < 0)):
+        rounds += 1
+        uncolored = layers < 0
+
+        # A box waits while an uncolored neighbour outranks it.
+        blocked = np.zeros(shape=(num_boxes,), dtype=bool)
+        wait = uncolored[u] & uncolored[v] & (rank[v] > rank[u])
+        blocked[u[wait]] = True
+        sel = np.flatnonzero(uncolored & ~blocked)
+
+        # Smallest layer not taken by a colored neighbour of each selected box.
+        row = np.full(shape=(num_boxes,), fill_value=-1)
+        row[sel] = np.arange(len(sel))
+        taken = (row[u] >= 0) & (layers[v] >= 0)
+        used = np.zeros(shape=(len(sel), np.max(layers) + 2), dtype=bool)
+        used[row[u[taken]], layers[v[taken]]] = True
+        layers[sel] = np.argmin(used, axis=1)
+
+    return layers, rounds
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+def swept_pairs(start, end, boxShape):
+    """ Broad phase, find the pairs of UAVs whose swept boxes can overlap along straight paths.
+    Input:
+        start, end: (N,3) arrays of initial and final positions.
+        boxShape: (3,) box size (length (X axis), wide (Y axis), height (Z axis)).
+    Output:
+        pairs: (M,2) int array of index pairs whose swept bounding boxes overlap.
+    """
+    half = np.asarray(boxShape, dtype=float)/2
+    lo = np.minimum(start, end) - half
+    hi = np.maximum(start, end) + half
+
+    # Sort and sweep along X, each box is paired with the following boxes that start before it ends.
+    order = np.argsort(lo[:, 0], kind='stable')
+    lo_x = lo[order, 0]
+    stop = np.searchsorted(lo_x, hi[order, 0], side='left')
+    counts = np.maximum(stop - np.arange(len(order)) - 1, 0)
+
+    first = np.repeat(np.arange(len(order)), counts)
+    second = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts) + \
+        first + 1
+    i, j = order[first], order[second]
+
+    # Keep the pairs that also overlap along Y and Z.
+    overlap = np.all((lo[i, 1:] < hi[j, 1:]) & (lo[j, 1:] < hi[i, 1:]), axis=1)
+
+    return np.sort(np.column_stack([i[overlap], j[overlap]]), axis=1)
+
+
+def pair_conflicts(start, end, size, i, j, delay_i, delay_j, duration):
+    """ First conflict time of each pair (i[k], j[k]) with per-pair start delays, inf if they never conflict.
+    """
+    # The relative position is piecewise linear between the start and stop times of both UAVs.
+    bounds = np.sort(np.column_stack([np.zeros(len(i)), delay_i, delay_i + duration,
+                                      delay_j, delay_j + duration]), axis=1)
+
+    def relative(t):
+        ui = np.clip((t - delay_i)/duration, 0, 1)[:, None]
+        uj = np.clip((t - delay_j)/duration, 0, 1)[:, None]
+        return (start[i] + ui*(end[i] - start[i])) - (start[j] + uj*(end[j] - start[j]))
+
+    times = np.full(shape=(len(i),), fill_value=np.inf)
+    for k in range(bounds.shape[1] - 1):
+        a, b = bounds[:, k], bounds[:, k + 1]
+        d0 = relative(a)
+        v = relative(b) - d0
+
+        # Along each axis, |d0 + u*v| < size holds for u within (u1, u2), intersect them for u in [0, 1].
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u1 = (-size - d0)/v
+            u2 = (size - d0)/v
+        still = v == 0
+        inside = np.abs(d0) < size
+        lo = np.where(still, np.where(inside, -np.inf, np.inf),
+                      np.minimum(u1, u2))
+        hi = np.where(still, np.where(inside, np.inf, -np.inf),
+                      np.maximum(u1, u2))
+        u_lo = np.maximum(np.max(lo, axis=1), 0)
+        u_hi = np.minimum(np.min(hi, axis=1), 1)
+
+        hit = (u_lo < u_hi) & np.isinf(times)
+        times[hit] = a[hit] + u_lo[hit]*(b[hit] - a[hit])
+
+    # Both UAVs hover at their end positions after the last bound.
+    d_end = relative(bounds[:, -1])
+    hover = np.all(np.abs(d_end) < size, axis=1) & np.isinf(times)
+    times[hover] = bounds[hover, -1]
+
+    return times
+
+
+def closest_approach(start, end, boxShape, delays=None, duration=1.0, pairs=None):
+    """ Closed-form check of the straight-line transitions of a swarm, every UAV flies from start to end
+    at constant velocity during duration, after its start delay.
+    Input:
+        start, end: (N,3) arrays of initial and final positions.
+        boxShape: (3,) box size, two UAVs conflict if their centers get closer than one box size along every axis.
+        delays: optional (N,) array of start delays.
+        duration: transition duration of every UAV.
+        pairs: optional (M,2) candidate pairs, computed with swept_pairs() if not given.
+    Output:
+        conflicts: (K,2) int array of conflicting pairs.
+        times: (K,) array with the first conflict time of each pair.
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    delays = np.zeros(shape=(len(start),)) if delays is None else np.asarray(
+        delays, dtype=float)
+    if pairs is None:
+        pairs = swept_pairs(start, end, boxShape)
+    i, j = pairs[:, 0], pairs[:, 1]
+
+    times = pair_conflicts(start, end, np.asarray(boxShape, dtype=float), i, j,
+                           delays[i], delays[j], duration)
+    conflict = np.isfinite(times)
+
+    return pairs[conflict], times[conflict]
+
+
+def stagger_delays(start, end, boxShape, step=0.25, duration=1.0, max_iter=100):
+    """ Resolve the transition conflicts with staggered start delays. Pairs that conflict even if one
+    UAV waits for the other to finish can't be resolved by delays and are left as they are. At each
+    iteration the waiting UAV of each remaining pair is delayed by step.
+    Output:
+        delays: (N,) array of start delays.
+        conflicts, times: the conflicts left, see closest_approach().
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    size = np.asarray(boxShape, dtype=float)
+    delays = np.zeros(shape=(len(start),))
+
+    # Drop the pairs that conflict in both sequential orders, and keep for each remaining pair the UAV
+    # that has to wait for the other one. Every candidate pair is kept, since delays can create new conflicts.
+    pairs = swept_pairs(start, end, boxShape)
+    i, j = pairs[:, 0], pairs[:, 1]
+    zero = np.zeros(shape=(len(pairs),))
+    j_waits = np.isinf(pair_conflicts(
+        start, end, size, i, j, zero, zero + duration, duration))
+    i_waits = np.isinf(pair_conflicts(
+        start, end, size, i, j, zero + duration, zero, duration))
+    resolvable = i_waits | j_waits
+
+    # If either UAV can wait, the one with the longer travel does, a global order that avoids waiting cycles.
+    travel = np.linalg.norm(end - start, axis=1)
+    j_waits &= ~i_waits | (travel[j] >= travel[i])
+    first = np.where(j_waits, i, j)[resolvable]
+    second = np.where(j_waits, j, i)[resolvable]
+
+    # Forced orders can still form cycles, so the delays with the fewest conflicts are kept.
+    best, best_count = delays.copy(), np.inf
+    for it in range(max_iter):
+        times = pair_conflicts(start, end, size, first, second,
+                               delays[first], delays[second], duration)
+        conflict = np.isfinite(times)
+        if np.sum(conflict) < best_count:
+            best, best_count = delays.copy(), np.sum(conflict)
+        if not np.any(conflict):
+            break
+
+        delays[np.unique(second[conflict])] += step
+    delays = best
+
+    conflicts, times = closest_approach(
+        start, end, boxShape, delays, duration, pairs)
+
+    return delays, conflicts, times
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def find_images(inputs):
+    """ Expand a directory, a glob pattern or a list of them into a sorted list of image paths.
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(os.path.join(item, f) for f in os.listdir(item)
+                         if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.extend(glob.glob(item))
+
+    return sorted(set(paths))
+
+
+def run_job(mode, in_path, out_path, kwargs):
+    """ Run the pipeline of a single image, the exception traceback is returned instead of raised
+    so one failing image doesn't stop the batch.
+    """
+    try:
+        if mode == 'lightPainting':
+            from crazyKhoreia.lightPainting import lightPainting
+            lightPainting(in_path=in_path, out_path=out_path,
+                          headless=True, **kwargs)
+        elif mode == 'multiDroneFormation':
+            from crazyKhoreia.multiDroneFormation import multiDroneFormation
+            multiDroneFormation(in_path=in_path, out_path=out_path,
+                                headless=True, **kwargs)
+        else:
+            raise ValueError("Unknown mode: " + str(mode))
+    except Exception:
+        return in_path, traceback.format_exc()
+
+    return in_path, None
+
+
+def iter_batch(inputs, out_path, mode='lightPainting', workers=None, **kwargs):
+    """ Process every image in inputs over a process pool and yield (in_path, error) as each job finishes.
+    Input:
+        inputs: directory, glob pattern or list of them.
+        out_path: files output path, shared by every image.
+        mode: either 'lightPainting' or 'multiDroneFormation'.
+        workers: number of worker processes, defaults to the number of CPUs.
+        kwargs: remaining parameters of the pipeline class, such as dims or boxShape.
+    Output:
+        error is None if the image was processed, else the traceback of the failure.
+    """
+    paths = find_images(inputs)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(run_job, mode, in_path, out_path, kwargs)
+                for in_path in paths]
+        for job in as_completed(jobs):
+            yield job.result()
+
+
+def run_batch(inputs, out_path, mode='lightPainting', workers=None, **kwargs):
+    """ Process every image in inputs, see iter_batch(), and return the list of (in_path, error).
+    """
+    return list(iter_batch(inputs, out_path, mode, workers, **kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Turn a directory of images into crazyKhoreia choreographies.")
+    parser.add_argument('inputs', nargs='+',
+                        help="Image directories or glob patterns.")
+    parser.add_argument('-o', '--out_path', required=True,
+                        help="Files output path.")
+    parser.add_argument('-m', '--mode', default='lightPainting',
+                        choices=['lightPainting', 'multiDroneFormation'])
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Number of worker processes, defaults to the number of CPUs.")
+    parser.add_argument('--dims', type=float, nargs=6, required=True, metavar=('MIN_X', 'MIN_Y', 'MIN_Z', 'MAX_X', 'MAX_Y', 'MAX_Z'),
+                        help="Flight space constraints.")
+    parser.add_argument('--detail', type=float, default=0.05)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--sleepTime', type=float, default=1.5)
+    parser.add_argument('--led', action='store_true')
+    parser.add_argument('--boxShape', type=float, nargs=3,
+                        default=[0.3, 0.3, 0.3])
+    parser.add_argument('--num_drones', type=int, default=10)
+    parser.add_argument('--cache', default=None,
+                        help="Contour cache directory, reused across runs.")
+    args = parser.parse_args(argv)
+
+    dims = [args.dims[:3], args.dims[3:]]
+    if args.mode == 'lightPainting':
+        kwargs = dict(dims=dims, detail=args.detail, speed=args.speed,
+                      sleepTime=args.sleepTime, led=args.led)
+    else:
+        kwargs = dict(dims=dims, boxShape=args.boxShape,
+                      num_drones=args.num_drones)
+
+    if args.cache is not None:
+        from crazyKhoreia.contourCache import contourCache
+        kwargs['cache'] = contourCache(args.cache)
+
+    os.makedirs(args.out_path, exist_ok=True)
+    out_path = os.path.join(args.out_path, '')
+
+    failed = 0
+    for in_path, error in iter_batch(args.inputs, out_path, args.mode, args.workers, **kwargs):
+        if error is None:
+            print("Done: " + in_path)
+        else:
+            failed += 1
+            print("Failed: " + in_path + "\n" + error)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import struct
+
+import numpy as np
+
+# File layout: MAGIC, a little-endian uint32 format version and uint64 header length, the JSON header,
+# then every array's raw bytes (C order) starting at a multiple of ALIGNMENT from the file start.
+MAGIC = b'CKHR'
+VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct('<4sIQ')
+
+
+def _align(n):
+    return -(-n//ALIGNMENT)*ALIGNMENT
+
+
+def save_binary(path, arrays, params=None):
+    """ Write arrays and run parameters to a single memory-mappable file.
+    Input:
+        path: output file path, conventionally with the .ckb extension.
+        arrays: dict of name -> numpy array, stored with its dtype in little-endian byte order.
+        params: optional JSON serializable dict of run parameters.
+    """
+    arrays = {name: np.ascontiguousarray(a, dtype=np.asarray(a).dtype.newbyteorder('<'))
+              for name, a in arrays.items()}
+
+    # Array offsets depend on the header length, which depends on the offsets' digits, so the
+    # header is rebuilt until its length settles.
+    header_len = 0
+    while(1):
+        offset = _align(PREFIX.size + header_len)
+        entries = {}
+        for name, a in arrays.items():
+            entries[name] = dict(dtype=a.dtype.str, shape=list(a.shape),
+                                 offset=offset)
+            offset = _align(offset + a.nbytes)
+        header = json.dumps(dict(arrays=entries, params=params or {}),
+                            default=_to_json).encode()
+        if len(header) == header_len:
+            break
+        header_len = len(header)
+
+    # Write to a temporary file and rename it, so readers never map a partial file.
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for name, a in arrays.items():
+            f.write(b'\0'*(entries[name]['offset'] - f.tell()))
+            f.write(a.tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_binary(path, mmap=True):
+    """ Read a file written by save_binary().
+    Input:
+        path: file path.
+        mmap: if set the arrays are read-only np.memmap views of the file (zero copy), else they are loaded.
+    Output:
+        arrays: dict of name -> array.
+        params: dict of run parameters.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) != PREFIX.size:
+            raise ValueError("Not a crazyKhoreia binary file: " + str(path))
+        magic, version, header_len = PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError("Not a crazyKhoreia binary file: " + str(path))
+        if version > VERSION:
+            raise ValueError("Unsupported binary format version: " + str(version))
+        header = json.loads(f.read(header_len))
+
+        arrays = {}
+        for name, entry in header['arrays'].items():
+            dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+            count = int(np.prod(shape))
+            if mmap == True and count > 0:
+                arrays[name] = np.memmap(f, dtype=dtype, mode='r',
+                                         offset=entry['offset'], shape=shape)
+            else:
+                f.seek(entry['offset'])
+                arrays[name] = np.fromfile(
+                    f, dtype=dtype, count=count).reshape(shape)
+
+    return arrays, header['params']
+
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+class contourCache():
+    """
+    Persistent, content-addressed cache of the contour extraction results (process_image and process_contours).
+    Attributes:
+        cache_dir   (str):      Directory where the cache entries are stored.
+        max_bytes   (int):      Maximum cache size, the least recently used entries are evicted beyond it.
+
+    Methods:
+        key(in_path, params):
+            Return the cache key from the image bytes and the extraction parameters.
+        get(key):
+            Return the cached entry as a dict of arrays, or None if missing.
+        put(key, contours, cnt_points, cnt_offsets, img_shape):
+            Store an entry and evict the least recently used ones if the cache is full.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir, self.max_bytes = cache_dir, max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, in_path, params):
+        h = hashlib.sha256()
+        with open(in_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        h.update(json.dumps([self.VERSION, params],
+                 sort_keys=True, default=str).encode())
+
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self, key):
+        try:
+            with np.load(self.path(key)) as data:
+                entry = {k: data[k] for k in data.files}
+        except (OSError, ValueError):
+            return None
+
+        # Refresh the entry's access time for the LRU policy, another process may have evicted it meanwhile.
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self.path(key))
+
+        # Rebuild the contour list from its flat store.
+        offsets = entry.pop('contours_offsets')
+        points = entry.pop('contours_points')
+        entry['contours'] = [points[offsets[i]:offsets[i + 1]]
+                             for i in range(len(offsets) - 1)]
+
+        return entry
+
+    def put(self, key, contours, cnt_points, cnt_offsets, img_shape):
+        contours_offsets = np.zeros(shape=(len(contours) + 1,), dtype=np.intp)
+        contours_offsets[1:] = np.cumsum([len(cnt) for cnt in contours])
+        contours_points = np.concatenate(contours) if len(
+            contours) else np.empty(shape=(0, 1, 2), dtype=np.int32)
+
+        # Write to a temporary file and rename it, so concurrent readers never see partial entries.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, contours_points=contours_points, contours_offsets=contours_offsets,
+                         cnt_points=cnt_points, cnt_offsets=cnt_offsets, img_shape=np.array(img_shape))
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith('.npz'):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, f))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f))
+
+        # Remove the least recently used entries until the cache fits in max_bytes.
+        total = sum(size for _, size, _ in entries)
+        for _, size, f in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, f))
+            except OSError:
+                pass
+            total -= size
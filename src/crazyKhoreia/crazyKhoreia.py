@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
+import time
+
 import cv2 as cv
 import numpy as np
-from cycler import cycler
-from matplotlib import pyplot as plt
+
+from crazyKhoreia.stageProfiler import NULL_PROFILER
 
 
 class crazyKhoreia():
@@ -13,47 +15,135 @@ class crazyKhoreia():
         dims        (array):    2x3 float array containing flight space constraints in the x, y, and z axis [[MIN_X, MIN_Y, MIN_Z],[MAX_X, MAX_Y, MAX_Z]]
         in_path     (str):      Global image's path to process.
         led         (bool):     Whether or not to control LED light relative to out of contour travel. TODO: Is this really necessary?
+        headless    (bool):     Set to compute and save results without creating any figure, plots remain available on demand.
+        cache       (object):   Optional contourCache instance to reuse the contour extraction results of previous runs.
+        simplify    (str):      Optional contour simplification: 'dp' (Douglas-Peucker), 'curvature' (curvature-adaptive sampling) or 'arclength' (fixed arc-length resampling).
+        resolution  (float):    UAV's physical resolution in meters, the simplification tolerance or sample spacing.
+        pyramid     (bool):     Set to decode the image at a working resolution chosen from dims and resolution instead of its full size.
+        profiler    (object):   Optional stageProfiler instance recording the time and memory of every stage.
         
-        cnt_scaled  (list):     List of processed contours.
+        contours    (list):     List of contours found in the image, in pixels.
+        cnt_points  (array):    n x 2 float array with the points of every processed contour.
+        cnt_offsets (array):    Contour i spans cnt_points[cnt_offsets[i]:cnt_offsets[i + 1]].
+        cnt_scaled  (list):     List of processed contours (views over cnt_points).
 
     Methods:
+        configure(dims, in_path, ...):
+            Set the attributes, without reading the image.
+        load_contours(img=None):
+            Loads the processed contours of in_path (or of the given in-memory image), simplified if set.
+        read_image():
+            Reads the image, at the working resolution if pyramid is set.
         process_image():
             Processes image, generate and return a contour list.
+        read_contours():
+            Looks up the processed contours of in_path in the cache if set, else reads the image and extracts them.
         process_contours(contours):
-            Processes contours and returns a new list of processed contours.
+            Processes contours and returns their points and offsets as a flat contour store.
+        simplify_contours():
+            Simplifies the processed contours to the UAV's resolution and returns a new flat contour store.
+        order_contours(time_budget=0.8):
+            Chooses the contours' visiting order, entry points and directions to minimize the off-contour travel,
+            with a nearest neighbour tour improved by 2-opt until time_budget seconds.
+        dead_travel(cnt_points=None, cnt_offsets=None):
+            Returns the off-contour travel distance between consecutive contours.
         get_waypoints():
             Extracts waypoints from processed contours, if set, add a LED control column.
+        plot_image():
+            Plot a figure with the original image, the threshold image and the found contours.
         plot_contour_inspection(waypoints):
             Plot a figure containing al contours and waypoints with their start/end points.
+        plot():
+            Plot every figure of the pipeline.
     """
 
-    def __init__(self, dims, in_path, led=False):
-        self.dims, self.in_path, self.led = dims, in_path, led
+    def __init__(self, dims, in_path, led=False, headless=False, cache=None, simplify=None, resolution=0.05, pyramid=False, profiler=None):
+        self.configure(dims, in_path, led, headless, cache, simplify, resolution, pyramid, profiler)
+
+        self.load_contours()
+
+    def configure(self, dims, in_path, led=False, headless=False, cache=None, simplify=None, resolution=0.05, pyramid=False, profiler=None):
+        self.dims, self.in_path, self.led, self.headless, self.cache = dims, in_path, led, headless, cache
+        self.simplify, self.resolution, self.pyramid = simplify, resolution, pyramid
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+
+    def load_contours(self, img=None):
+        # Process an in-memory image (e.g. a video frame) if given, else read in_path.
+        if img is not None:
+            self.img = img
+            with self.profiler.stage('process_image', pixels=self.img.shape[0]*self.img.shape[1]) as rec:
+                self.contours = self.process_image()
+                rec['contours'] = len(self.contours)
+            with self.profiler.stage('process_contours') as rec:
+                self.cnt_points, self.cnt_offsets = self.process_contours(
+                    self.contours)
+                rec['points'] = len(self.cnt_points)
+        else:
+            self.read_contours()
+
+        # Simplify the contours to the UAV's physical resolution, if set.
+        if self.simplify is not None:
+            with self.profiler.stage('simplify_contours', mode=self.simplify, points_in=len(self.cnt_points)) as rec:
+                self.cnt_points, self.cnt_offsets = self.simplify_contours()
+                rec['points'] = len(self.cnt_points)
+
+    def read_contours(self):
+        # Look up the contours of this image and extraction parameters in the cache, if any.
+        entry = None
+        if self.cache is not None:
+            params = {'dims': np.asarray(self.dims).tolist()}
+            if self.pyramid == True:
+                params['pyramid'] = self.resolution
+            key = self.cache.key(self.in_path, params)
+            with self.profiler.stage('cache_get') as rec:
+                entry = self.cache.get(key)
+                rec['hit'] = entry is not None
+
+        if entry is not None:
+            # The image is only decoded again if a plot needs it.
+            self.img, self.img_bw = None, None
+            self.contours = entry['contours']
+            self.cnt_points, self.cnt_offsets = entry['cnt_points'], entry['cnt_offsets']
+        else:
+            # Read image.
+            with self.profiler.stage('read_image') as rec:
+                self.img = self.read_image()
+                rec['shape'] = self.img.shape
+
+            # Proccess image and get contours from it.
+            with self.profiler.stage('process_image') as rec:
+                self.contours = self.process_image()
+                rec['contours'] = len(self.contours)
+
+            # Proccess the contours and get its parameters relative to the input image.
+            with self.profiler.stage('process_contours') as rec:
+                self.cnt_points, self.cnt_offsets = self.process_contours(
+                    self.contours)
+                rec['points'] = len(self.cnt_points)
 
-        # Read image.
-        self.img = cv.imread(self.in_path, cv.IMREAD_UNCHANGED)
+            if self.cache is not None:
+                with self.profiler.stage('cache_put'):
+                    self.cache.put(key, self.contours, self.cnt_points,
+                                   self.cnt_offsets, self.img.shape)
 
-        # Proccess image and get contours from it.
-        contours = self.process_image()
+    def read_image(self):
+        if self.pyramid == True:
+            from crazyKhoreia._imageDecode import read_reduced
 
-        # Proccess the contours and get its parameters relative to the input image.
-        self.cnt_scaled = self.process_contours(contours)
+            return read_reduced(self.in_path, self.dims, self.resolution)
+
+        return cv.imread(self.in_path, cv.IMREAD_UNCHANGED)
 
     def process_image(self):
         # If the image type is png, it'll have a fourth channel known as alpha, which is transparency,
-        # in that case, the background will be filled in white.
+        # in that case, the background will be filled in white (by row strips, to bound the memory).
         if self.img.shape[2] == 4:
-            bg = np.array([255, 255, 255])
-            alpha = (self.img[:, :, 3] /
-                     255).reshape(self.img.shape[:2] + (1,))
-            self.img = ((bg * (1 - alpha)) +
-                        (self.img[:, :, :3] * alpha)).astype(np.uint8)
+            from crazyKhoreia._imageDecode import composite
 
-        # Flip image.
-        img_flipped = cv.flip(self.img, 0)
+            self.img = composite(self.img)
 
-        # Convert the image from BGR to grayscale.
-        im_gray = cv.cvtColor(img_flipped, cv.COLOR_BGR2GRAY)
+        # Convert the image from BGR to grayscale and flip it.
+        im_gray = cv.flip(cv.cvtColor(self.img, cv.COLOR_BGR2GRAY), 0)
 
         # Binarize the grayscale image.
         th, img_bw = cv.threshold(im_gray, 128, 192, cv.THRESH_OTSU)
@@ -64,34 +154,14 @@ class crazyKhoreia():
         contours = list(contours)
 
         # Find frame countour, if any, and delete it (see: https://stackoverflow.com/questions/29329866/how-to-avoid-detecting-image-frame-when-using-findcontours).
-        for contour in contours:
-            x, y, w, h = cv.boundingRect(contour)
-            cnt_size = w*h
-            ImgShape_Y, ImgShape_X = self.img.shape[:2]
-            img_size = ImgShape_Y*ImgShape_X
-            ERROR_THRESHOLD = 0.01
-            error = abs(cnt_size-img_size)
-            if(error <= ERROR_THRESHOLD):
-                contours.remove(contour)
-
-        # Create subplots for original image and image with contours visualization.
-        fig, (ax0, ax1, ax2) = plt.subplots(nrows=1, ncols=3)
-
-        # img[..., ::-1] reverts the image's channel order from BGR to RGB so it can be correctly displayed by plt.imshow()
-        ax0.imshow(self.img[..., ::-1])
-        ax0.set_axis_off()
-        ax0.set_title("Original image.")
-        ax1.imshow(cv.flip(img_bw, 0), cmap='gray')
-        ax1.set_axis_off()
-        ax1.set_title("Threshold image.")
-        ax2.set_axis_off()
-        ax2.set_title("Image with contours.")
-
-        # Draw contours on original image.
-        img_with_contour = cv.drawContours(
-            image=img_flipped, contours=contours, contourIdx=-1, color=(0, 255, 0), thickness=3, lineType=cv.LINE_AA)
+        ImgShape_Y, ImgShape_X = self.img.shape[:2]
+        img_size = ImgShape_Y*ImgShape_X
+        ERROR_THRESHOLD = 0.01
+        contours = [contour for contour in contours
+                    if abs(np.prod(cv.boundingRect(contour)[2:]) - img_size) > ERROR_THRESHOLD]
 
-        ax2.imshow(cv.flip(img_with_contour[..., ::-1], 0))
+        # Keep the threshold image to plot it on demand.
+        self.img_bw = img_bw
 
         return contours
 
@@ -103,42 +173,237 @@ class crazyKhoreia():
         scale_fact_x = ImgShape_X/(self.dims[1][1] - self.dims[0][1])
         scale_fact_y = ImgShape_Y/(self.dims[1][2] - self.dims[0][2])
 
-        # Scale contours if needed to satisfy maximum dimensions requirements.
-        cnt_scaled = []
+        # Store every contour point in one contiguous buffer, contour i spans
+        # cnt_points[cnt_offsets[i]:cnt_offsets[i + 1]].
+        cnt_offsets = np.zeros(shape=(len(contours) + 1,), dtype=np.intp)
+        cnt_offsets[1:] = np.cumsum([len(cnt) for cnt in contours])
+        cnt_points = np.concatenate(contours).reshape(-1, 2).astype(float)
 
-        for cnt in contours:
-            cnt = cnt - [ImgShape_X/2, ImgShape_Y/2]
-            if(scale_fact_x > 1.0 or scale_fact_y > 1.0):
-                if(scale_fact_x > scale_fact_y):
-                    cnt_scaled.append(cnt*(1.0/scale_fact_x))
+        # Scale contours if needed to satisfy maximum dimensions requirements.
+        cnt_points -= [ImgShape_X/2, ImgShape_Y/2]
+        if(scale_fact_x > 1.0 or scale_fact_y > 1.0):
+            cnt_points *= 1.0/max(scale_fact_x, scale_fact_y)
+
+        # Translate the scaled contours to satisfy minimum dimensions requirements.
+        cnt_points += np.abs(np.min(cnt_points, axis=0)) + \
+            [self.dims[0][1], self.dims[0][2]]
+
+        return cnt_points, cnt_offsets
+
+    def simplify_contours(self):
+        if self.simplify == 'dp':
+            # Douglas-Peucker, keep the vertices that deviate more than resolution from the simplified contour.
+            contours = [cv.approxPolyDP(self.cnt_points[self.cnt_offsets[i]:self.cnt_offsets[i + 1]].astype(np.float32).reshape(-1, 1, 2),
+                                        epsilon=self.resolution, closed=True).reshape(-1, 2)
+                        for i in range(len(self.cnt_offsets) - 1)]
+            cnt_offsets = np.zeros(shape=(len(contours) + 1,), dtype=np.intp)
+            cnt_offsets[1:] = np.cumsum([len(cnt) for cnt in contours])
+
+            return np.concatenate(contours).astype(float), cnt_offsets
+
+        # Contours are closed, so each point is joined to the next one and the last point back to the first.
+        num_points = len(self.cnt_points)
+        contour = np.repeat(np.arange(len(self.cnt_offsets) - 1),
+                            np.diff(self.cnt_offsets))
+        start, length = self.cnt_offsets[contour], np.diff(self.cnt_offsets)[
+            contour]
+        local = np.arange(num_points) - start
+        nxt = start + (local + 1) % length
+        ds = np.linalg.norm(self.cnt_points[nxt] - self.cnt_points, axis=1)
+
+        if self.simplify == 'arclength':
+            # Fixed arc-length resampling, one point every resolution meters.
+            measure = ds
+        elif self.simplify == 'curvature':
+            # Curvature-adaptive sampling, every ANGLE_STEP radians of turning count as resolution
+            # meters more of length, so curved parts get denser samples. The curvature is measured
+            # over a window of about one resolution on each side to ignore the pixel staircase.
+            ANGLE_STEP = np.pi/8
+            w = max(1, int(round(self.resolution/max(np.mean(ds), 1e-12))))
+            back = self.cnt_points - \
+                self.cnt_points[start + (local - w) % length]
+            fwd = self.cnt_points[start + (local + w) %
+                                  length] - self.cnt_points
+            turn = np.abs((np.arctan2(fwd[:, 1], fwd[:, 0]) - np.arctan2(back[:, 1], back[:, 0]) + np.pi) %
+                          (2*np.pi) - np.pi)
+            chord = (np.linalg.norm(fwd, axis=1) +
+                     np.linalg.norm(back, axis=1))/2
+            curvature = turn/np.where(chord > 0, chord, 1)
+            measure = ds*(1 + self.resolution*curvature/ANGLE_STEP)
+        else:
+            raise ValueError("Unknown simplification: " + str(self.simplify))
+
+        # Number of samples of each contour from its total measure.
+        cum = np.cumsum(measure)
+        total = np.add.reduceat(measure, self.cnt_offsets[:-1])
+        num_samples = np.maximum(
+            1, np.ceil(total/self.resolution - 1e-9)).astype(np.intp)
+        cnt_offsets = np.zeros(shape=(len(num_samples) + 1,), dtype=np.intp)
+        cnt_offsets[1:] = np.cumsum(num_samples)
+
+        # Evenly spaced targets along each contour's measure, then locate their segments.
+        sample_contour = np.repeat(np.arange(len(num_samples)), num_samples)
+        k = np.arange(cnt_offsets[-1]) - cnt_offsets[sample_contour]
+        targets = cum[self.cnt_offsets[sample_contour]] - measure[self.cnt_offsets[sample_contour]] + \
+            k*total[sample_contour]/num_samples[sample_contour]
+        i = np.clip(np.searchsorted(cum, targets, side='right'),
+                    self.cnt_offsets[sample_contour], self.cnt_offsets[sample_contour + 1] - 1)
+        frac = np.clip((targets - (cum[i] - measure[i])) /
+                       np.where(measure[i] > 0, measure[i], 1), 0, 1)
+
+        cnt_points = self.cnt_points[i] + frac[:, None] * \
+            (self.cnt_points[nxt[i]] - self.cnt_points[i])
+
+        return cnt_points, cnt_offsets
+
+    def dead_travel(self, cnt_points=None, cnt_offsets=None):
+        # Off-contour (LED off) distance, from each contour's end point to the next contour's start point.
+        cnt_points = self.cnt_points if cnt_points is None else cnt_points
+        cnt_offsets = self.cnt_offsets if cnt_offsets is None else cnt_offsets
+
+        return np.sum(np.linalg.norm(cnt_points[cnt_offsets[1:-1]] - cnt_points[cnt_offsets[1:-1] - 1], axis=1))
+
+    def order_contours(self, time_budget=0.8):
+        from scipy.spatial import cKDTree
+
+        deadline = time.perf_counter() + time_budget
+        num_cnt = len(self.cnt_offsets) - 1
+        lengths = np.diff(self.cnt_offsets)
+
+        # Each contour in the tour is entered at a point and, being closed, traversed all the way
+        # around in a direction (+1 or -1), so it's left next to its entry point.
+        tour = np.zeros(shape=(num_cnt,), dtype=np.intp)
+        entry = np.zeros(shape=(num_cnt,), dtype=np.intp)
+        direction = np.ones(shape=(num_cnt,), dtype=np.intp)
+
+        # Nearest neighbour tour from the first contour, over up to CANDIDATES evenly spaced points per contour.
+        CANDIDATES = 16
+        counts = np.minimum(lengths, CANDIDATES)
+        owner = np.repeat(np.arange(num_cnt), counts)
+        k = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cand = self.cnt_offsets[owner] + k*lengths[owner]//counts[owner]
+
+        visited = np.zeros(shape=(num_cnt,), dtype=bool)
+        visited[0] = True
+        remaining = ~visited[owner]
+        tree, tree_idx = cKDTree(self.cnt_points[cand[remaining]]), cand[remaining]
+        tree_owner, stale = owner[remaining], 0
+        pos = self.cnt_points[self.cnt_offsets[1] - 1]
+
+        for t in range(1, num_cnt):
+            num_query = 8
+            while(1):
+                num_query = min(num_query, len(tree_idx))
+                _, nn = tree.query(pos, k=num_query)
+                nn = np.atleast_1d(nn)
+                free = nn[~visited[tree_owner[nn]]]
+                if len(free):
+                    break
+                elif 2*stale < len(tree_idx):
+                    num_query *= 2
                 else:
-                    cnt_scaled.append(cnt*(1.0/scale_fact_y))
-
-       # Translate the scaled contours to satisfy minimum dimensions requirements.
-        minX = []
-        minY = []
-
-        for cnt in cnt_scaled:
-            x = np.array(cnt)
-            x = np.reshape(x, (len(cnt), 2))
-            minX.append(min(x[:, 0]))
-            minY.append(min(x[:, 1]))
+                    # Rebuild the tree with the unvisited candidates once half of it is visited.
+                    remaining = ~visited[tree_owner]
+                    tree, tree_idx, tree_owner = cKDTree(
+                        self.cnt_points[tree_idx[remaining]]), tree_idx[remaining], tree_owner[remaining]
+                    num_query, stale = 8, 0
+
+            c = tree_owner[free[0]]
+            pts = self.cnt_points[self.cnt_offsets[c]:self.cnt_offsets[c + 1]]
+            e = np.argmin(np.sum((pts - pos)**2, axis=1))
+            tour[t], entry[t], visited[c] = c, e, True
+            stale += counts[c]
+            pos = pts[(e - 1) % len(pts)]
+
+        # Entry and exit points of each contour in the tour.
+        def endpoints():
+            n = lengths[tour]
+            E = self.cnt_points[self.cnt_offsets[tour] + entry]
+            X = self.cnt_points[self.cnt_offsets[tour] +
+                                (entry + direction*(n - 1)) % n]
+            return E, X
+
+        # 2-opt, reversing a stretch of the tour also reverses each of its contours, so the
+        # old exit points become the new entry points.
+        E, X = endpoints()
+        improved = True
+        while(improved and time.perf_counter() < deadline):
+            improved = False
+            for i in range(0, num_cnt - 2):
+                if time.perf_counter() > deadline:
+                    break
+                j = np.arange(i + 1, num_cnt)
+                old = np.linalg.norm(X[i] - E[i + 1])
+                nxt = np.minimum(j + 1, num_cnt - 1)
+                has_next = j + 1 < num_cnt
+                delta = np.linalg.norm(X[j] - X[i], axis=1) - old + \
+                    has_next*(np.linalg.norm(E[i + 1] - E[nxt], axis=1) -
+                              np.linalg.norm(X[j] - E[nxt], axis=1))
+                best = np.argmin(delta)
+                if delta[best] < -1e-9:
+                    j = j[best]
+                    seg = slice(i + 1, j + 1)
+                    n = lengths[tour[seg]]
+                    exits = (entry[seg] + direction[seg]*(n - 1)) % n
+                    tour[seg] = tour[seg][::-1]
+                    entry[seg] = exits[::-1]
+                    direction[seg] = -direction[seg][::-1]
+                    E[seg], X[seg] = X[seg][::-1].copy(), E[seg][::-1].copy()
+                    improved = True
+
+        # Rebuild the contour store in the new order, entry point and direction.
+        n = lengths[tour]
+        cnt_offsets = np.zeros(shape=(num_cnt + 1,), dtype=np.intp)
+        cnt_offsets[1:] = np.cumsum(n)
+        rep = np.repeat(np.arange(num_cnt), n)
+        local = (entry[rep] + direction[rep] *
+                 (np.arange(cnt_offsets[-1]) - cnt_offsets[rep])) % n[rep]
+        cnt_points = self.cnt_points[self.cnt_offsets[tour[rep]] + local]
+
+        print("Contour order: off-contour travel reduced from " + str(self.dead_travel()) +
+              " to " + str(self.dead_travel(cnt_points, cnt_offsets)) + " meters.")
+
+        return cnt_points, cnt_offsets
+
+    @property
+    def cnt_scaled(self):
+        # List view of the processed contours, each one as a k x 1 x 2 array.
+        return [self.cnt_points[self.cnt_offsets[i]:self.cnt_offsets[i + 1]].reshape(-1, 1, 2)
+                for i in range(len(self.cnt_offsets) - 1)]
+
+    def plot_image(self):
+        from matplotlib import pyplot as plt
+
+        # The image isn't loaded if the contours came from the cache.
+        if self.img is None:
+            self.img = self.read_image()
+            self.process_image()
 
-        minX = abs(min(minX))
-        minY = abs(min(minY))
+        # Create subplots for original image and image with contours visualization.
+        fig, (ax0, ax1, ax2) = plt.subplots(nrows=1, ncols=3)
 
-        cnt_scaled_x = []
-        for cnt in cnt_scaled:
-            cnt_x = cnt + [minX, minY] + [self.dims[0][1], self.dims[0][2]]
-            cnt_scaled_x.append(cnt_x)
+        # img[..., ::-1] reverts the image's channel order from BGR to RGB so it can be correctly displayed by plt.imshow()
+        ax0.imshow(self.img[..., ::-1])
+        ax0.set_axis_off()
+        ax0.set_title("Original image.")
+        ax1.imshow(cv.flip(self.img_bw, 0), cmap='gray')
+        ax1.set_axis_off()
+        ax1.set_title("Threshold image.")
+        ax2.set_axis_off()
+        ax2.set_title("Image with contours.")
 
-        cnt_scaled = cnt_scaled_x
+        # Draw contours on original image.
+        img_with_contour = cv.drawContours(
+            image=cv.flip(self.img, 0), contours=self.contours, contourIdx=-1, color=(0, 255, 0), thickness=3, lineType=cv.LINE_AA)
 
-        return cnt_scaled
+        ax2.imshow(cv.flip(img_with_contour[..., ::-1], 0))
 
     def plot_contour_inspection(self, wayPoints):
-        strPoints = np.empty((0, 2))
-        endPoints = np.empty((0, 2))
+        from cycler import cycler
+        from matplotlib import pyplot as plt
+
+        strPoints = self.cnt_points[self.cnt_offsets[:-1]]
+        endPoints = self.cnt_points[self.cnt_offsets[1:] - 1]
 
         # See https://matplotlib.org/3.5.1/gallery/color/named_colors.html#sphx-glr-gallery-color-named-colors-py for more colors.
         cc = (cycler(color=['purple', 'orange', 'lime', 'royalblue', 'steelblue', 'cyan', 'gold']) +
@@ -148,12 +413,8 @@ class crazyKhoreia():
         ax.set_prop_cycle(cc)
 
         # Iterate contours.
-        for i in range(0, len(self.cnt_scaled)):
-            x = np.array(self.cnt_scaled[i])
-            x = np.reshape(x, (len(self.cnt_scaled[i]), 2))
-
-            strPoints = np.vstack([strPoints, [x[0, 0], x[0, 1]]])
-            endPoints = np.vstack([endPoints, [x[-1, 0], x[-1, 1]]])
+        for i in range(0, len(self.cnt_offsets) - 1):
+            x = self.cnt_points[self.cnt_offsets[i]:self.cnt_offsets[i + 1]]
 
             ax.plot(x[:, 0], x[:, 1], label="Contour " + str(i), ls='--')
 
@@ -175,27 +436,20 @@ class crazyKhoreia():
         ax.legend()
         ax.set_title("Contour inspection.")
 
+    def plot(self):
+        self.plot_image()
+
     def get_waypoints(self):
         # Convert vectors (contours) to cartesian points in XYZ [meters] format.
         if self.led == True:
-            wayPoints = np.empty((0, 4))
+            wayPoints = np.empty((len(self.cnt_points), 4))
+            # The LED is turned off while travelling to each contour's start point.
+            wayPoints[:, 3] = 1
+            wayPoints[self.cnt_offsets[:-1], 3] = 0
         else:
-            wayPoints = np.empty((0, 3))
+            wayPoints = np.empty((len(self.cnt_points), 3))
 
-        # Iterate contours.
-        for i in range(0, len(self.cnt_scaled)):
-            x = np.array(self.cnt_scaled[i])
-            x = np.reshape(x, (len(self.cnt_scaled[i]), 2))
-
-            if self.led == True:
-                led = np.ones(shape=(len(x),))
-                led[0] = 0
-                stck = np.array(
-                    [1.5*np.ones(shape=(len(x),)), x[:, 0], x[:, 1], led]).T
-            else:
-                stck = np.array(
-                    [1.5*np.ones(shape=(len(x),)), x[:, 0], x[:, 1]]).T
-
-            wayPoints = np.vstack([wayPoints, stck])
+        wayPoints[:, 0] = 1.5
+        wayPoints[:, 1:3] = self.cnt_points
 
         return wayPoints
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def formation_job(kwargs):
+    """ Compute one formation in a worker process and return its initial grid and adjusted positions.
+    Only the formation stages run, the show saves its own waypoint sequences rather than each formation's files.
+    """
+    from crazyKhoreia._barePipeline import bare
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+    mdf = bare(multiDroneFormation, **kwargs)
+    mdf.load_contours()
+    mdf.initialGrid = mdf.estimateInitialGrid()
+    mdf.idealPositions = mdf.get_idealPositions(mdf.get_clusters(mdf.get_waypoints()))
+    mdf.adjustedPositions = mdf.getIoUsppd()
+    mdf.centerPositions()
+
+    return mdf.initialGrid, mdf.adjustedPositions
+
+
+class droneShow():
+    """
+    droneShow chains several multiDroneFormation formations into a show with one waypoint sequence per UAV.
+    Attributes:
+        dims            (array):    2x3 float array containing flight space constraints in the x, y, and z axis [[MIN_X, MIN_Y, MIN_Z],[MAX_X, MAX_Y, MAX_Z]]
+        boxShape        (array):    1x3 float array with the aerodynamical downwash effect constraints along the x, y and z axis.
+        in_paths        (list):     Ordered list of image paths, one per formation.
+        out_path        (str):      File output path.
+        num_drones      (int):      Number of UAVs in swarm.
+        objective       (str):      Transition objective, 'sum' minimizes the total travel and 'max' the longest travel.
+        workers         (int):      Number of worker processes computing the formations, defaults to the number of CPUs.
+        name            (str):      Output files prefix.
+
+        initialGrid     (array):    Array containing the initial drone configuration on ground.
+        formations      (list):     Adjusted positions of each formation.
+        sequence        (array):    num_drones x (len(in_paths) + 1) x 3 array, the waypoint sequence of each UAV.
+        travel          (list):     Maximum and total travel of each transition.
+
+    Methods:
+        compute_formations():
+            Compute the formations of every image in parallel.
+        assign_transition(start, goal, bound=None):
+            Assign each UAV in start to a slot in goal, returns the slot indices and the bottleneck distance.
+        save():
+            Export the waypoint sequence of each UAV in a .csv file.
+    """
+
+    def __init__(self, dims, boxShape, in_paths, out_path, num_drones, objective='sum', workers=None, name='show'):
+        self.dims, self.boxShape, self.in_paths, self.out_path = np.array(
+            dims), np.array(boxShape), list(in_paths), out_path
+        self.num_drones, self.objective, self.workers, self.name = num_drones, objective, workers, name
+
+        self.initialGrid, self.formations = self.compute_formations()
+
+        # Chain the transitions, with objective='max' each bottleneck search warm starts from the previous threshold.
+        self.sequence = np.zeros(
+            shape=(self.num_drones, len(self.formations) + 1, 3))
+        self.sequence[:, 0] = self.initialGrid
+        self.travel = []
+        bound = None
+
+        for f, goal in enumerate(self.formations):
+            slots, bound = self.assign_transition(
+                self.sequence[:, f], goal, bound)
+            self.sequence[:, f + 1] = goal[slots]
+
+            dist = np.linalg.norm(
+                self.sequence[:, f + 1] - self.sequence[:, f], axis=1)
+            self.travel.append((np.max(dist), np.sum(dist)))
+            print("Transition " + str(f) + ": maximum travel " + str(self.travel[-1][0]) +
+                  " meters, total travel " + str(self.travel[-1][1]) + " meters.")
+
+        self.save()
+
+    def compute_formations(self):
+        # Formations don't depend on each other, so they're computed in parallel.
+        jobs = [dict(dims=self.dims, boxShape=self.boxShape, in_path=in_path, num_drones=self.num_drones)
+                for in_path in self.in_paths]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(formation_job, jobs))
+
+        return results[0][0], [positions for _, positions in results]
+
+    def assign_transition(self, start, goal, bound=None):
+        from scipy.optimize import linear_sum_assignment
+        from scipy.spatial.distance import cdist
+
+        cost = cdist(start, goal)
+
+        if self.objective == 'sum':
+            row_ind, col_ind = linear_sum_assignment(cost)
+            return col_ind, np.max(cost[row_ind, col_ind])
+        elif self.objective != 'max':
+            raise ValueError("Unknown objective: " + str(self.objective))
+
+        # Bottleneck assignment, search the smallest distance threshold that still allows every UAV to
+        # reach a slot. The search starts at the previous transition's threshold, since consecutive
+        # formations tend to need similar ones, and widens exponentially from there.
+        values = np.unique(cost)
+        lower = max(np.max(np.min(cost, axis=1)), np.max(np.min(cost, axis=0)))
+        lo = np.searchsorted(values, lower)
+        hi = len(values) - 1
+
+        guess = lo if bound is None else min(
+            max(np.searchsorted(values, bound), lo), hi)
+        step = 1
+        if self.feasible(cost, values[guess]):
+            hi = guess
+            while(hi - step >= lo and self.feasible(cost, values[hi - step])):
+                hi -= step
+                step *= 2
+            lo = max(lo, hi - step + 1)
+        else:
+            lo = guess + 1
+            while(lo + step <= hi and not self.feasible(cost, values[lo + step - 1])):
+                lo += step
+                step *= 2
+            hi = min(hi, lo + step - 1)
+
+        while(lo < hi):
+            mid = (lo + hi)//2
+            if self.feasible(cost, values[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        threshold = values[lo]
+
+        # Among the assignments that respect the threshold, take the one with the least total travel.
+        penalized = np.where(cost <= threshold, cost, cost.max()
+                             * self.num_drones + 1)
+        row_ind, col_ind = linear_sum_assignment(penalized)
+
+        return col_ind, threshold
+
+    def feasible(self, cost, threshold):
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import maximum_bipartite_matching
+
+        matching = maximum_bipartite_matching(
+            csr_matrix(cost <= threshold), perm_type='column')
+
+        return np.all(matching >= 0)
+
+    def save(self):
+        for i in range(self.num_drones):
+            np.savetxt(self.out_path + self.name + '_uav' + str(i) +
+                       '_wpts.csv', self.sequence[i], delimiter=",")
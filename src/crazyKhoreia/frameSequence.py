@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+
+import cv2 as cv
+import numpy as np
+
+from crazyKhoreia.crazyKhoreia import crazyKhoreia
+from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+
+class frameSequence(multiDroneFormation):
+    """
+    multiDroneFormation's child class frameSequence computes one swarm formation per frame of a video or an image sequence.
+    Attributes:
+        dims                (array):    2x3 float array containing flight space constraints in the x, y, and z axis [[MIN_X, MIN_Y, MIN_Z],[MAX_X, MAX_Y, MAX_Z]]
+        in_path             (str):      Video file path, or image sequence directory or glob pattern.
+        out_path            (str):      File output path.
+        num_drones          (int):      Number of UAVs in swarm.
+        boxShape            (array):    Optional 1x3 float array with the aerodynamical downwash effect constraints, if set the IoU of every frame is minimized.
+        reuse_tol           (float):    Mean absolute pixel difference against the last processed frame below which a frame reuses its formation.
+        cluster_engine      (str):      Clustering engine, see multiDroneFormation.get_clusters().
+        simplify            (str):      Optional contour simplification: 'dp', 'curvature' or 'arclength'.
+        resolution          (float):    Simplification tolerance or sample spacing in meters.
+        headless            (bool):     Set to compute and save results without creating any figure, plots remain available on demand.
+
+        num_frames          (int):      Number of processed frames.
+        num_reused          (int):      Number of frames that reused the previous frame's formation.
+        positions           (array):    Formation of the last processed frame.
+
+    Methods:
+        run():
+            Process every frame and stream the formations to a .csv file.
+        iter_frames():
+            Yield the frames one at a time, without loading the whole sequence into memory.
+        process_frame(frame):
+            Extract the formation of a frame, warm started from the last processed frame's result.
+        save_frame(f, idx):
+            Append the current formation to the open output file.
+    """
+
+    def __init__(self, dims, in_path, out_path, num_drones, boxShape=None, reuse_tol=0.5, headless=False, cluster_engine='kmeans', simplify=None, resolution=0.05):
+        # Frames are loaded one at a time by run(), so no image is read here.
+        self.configure(dims, boxShape, in_path, out_path, num_drones, headless=headless,
+                       cluster_engine=cluster_engine, simplify=simplify, resolution=resolution)
+        self.reuse_tol = reuse_tol
+
+        self.positions, self.ref_frame = None, None
+        self.num_frames, self.num_reused = 0, 0
+
+        self.run()
+
+    def run(self):
+        # Name the output after the video file, or after the directory of an image sequence.
+        seq_path = os.path.dirname(self.in_path) if glob.has_magic(
+            self.in_path) else self.in_path
+        file_name = os.path.basename(os.path.normpath(seq_path))
+        name = file_name.split('.', 1)[0]
+
+        # Stream the formations to disk as each frame is processed.
+        with open(self.out_path + name + '_seq_wpts.csv', 'w') as f:
+            for idx, frame in enumerate(self.iter_frames()):
+                self.process_frame(frame)
+                self.save_frame(f, idx)
+                self.num_frames += 1
+
+        print("Processed " + str(self.num_frames) + " frames, " +
+              str(self.num_reused) + " reused the previous formation.")
+
+        if self.headless == False:
+            from matplotlib import pyplot as plt
+
+            self.plot()
+            plt.show()
+
+    def iter_frames(self):
+        if os.path.isdir(self.in_path) or glob.has_magic(self.in_path):
+            from crazyKhoreia.batchProcessing import find_images
+
+            for path in find_images(self.in_path):
+                yield cv.imread(path, cv.IMREAD_UNCHANGED)
+        else:
+            capture = cv.VideoCapture(self.in_path)
+            try:
+                while(1):
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    yield frame
+            finally:
+                capture.release()
+
+    def process_frame(self, frame):
+        # Frames that barely change from the last processed one keep its formation.
+        if self.ref_frame is not None and frame.shape == self.ref_frame.shape:
+            diff = cv.absdiff(frame, self.ref_frame)
+            if np.mean(diff) < self.reuse_tol:
+                self.num_reused += 1
+                return
+
+        self.ref_frame = frame
+        self.load_contours(frame)
+        self.wayPoints = self.get_waypoints()
+
+        # Warm start the clustering from the previous frame's centroids, this also keeps
+        # each cluster (UAV) index close to where it was in the previous frame.
+        init = None if self.positions is None else self.idealPositions[:, 1:3]
+        cc = self.get_clusters(self.wayPoints, init=init)
+        self.idealPositions = self.get_idealPositions(cc)
+
+        if self.boxShape is not None:
+            self.adjustedPositions = self.getIoUsppd()
+            self.centerPositions()
+            self.positions = self.adjustedPositions
+        else:
+            self.positions = self.idealPositions
+
+    def save_frame(self, f, idx):
+        rows = np.column_stack([np.full(self.num_drones, idx),
+                                np.arange(self.num_drones), self.positions])
+        np.savetxt(f, rows, delimiter=",", fmt=['%d', '%d', '%.18e', '%.18e', '%.18e'])
+
+    def plot(self):
+        crazyKhoreia.plot(self)
+        self.plot_clusters()
+        self.plot_idealPositions()
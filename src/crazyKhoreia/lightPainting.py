@@ -3,8 +3,6 @@
 import datetime
 import os
 
-import matplotlib.animation as animation
-import matplotlib.pyplot as plt
 import numpy as np
 
 from crazyKhoreia.crazyKhoreia import crazyKhoreia
@@ -21,77 +19,244 @@ class lightPainting(crazyKhoreia):
         speed       (float):    UAV speed.
         sleepTime   (float):    Percentage to estimate flight duration if the UAV stops at each waypoint. TODO: Is this really necessary?
         video       (bool):     Set to export a video animation of the UAV.
+        fps         (int):      Video frame rate.
+        points_per_frame (int): Number of waypoints drawn per video frame.
         led         (bool):     Whether or not to control LED light relative to out of contour travel. TODO: Is this really necessary?
+        headless    (bool):     Set to compute and save results without creating any figure, plots remain available on demand.
+        cache       (object):   Optional contourCache instance to reuse the contour extraction results of previous runs.
+        simplify    (str):      Optional contour simplification to the detail resolution: 'dp', 'curvature' or 'arclength'.
+        order       (bool):     Set to optimize the contours' visiting order, entry points and directions to shorten the off-contour travel.
+        pyramid     (bool):     Set to decode large images at a working resolution chosen from dims and detail.
+        rate        (float):    Optional setpoint rate in Hz, if set a timed setpoint stream (position, velocity and LED) is exported.
+        accel       (float):    UAV maximum acceleration for the setpoint stream.
+        drones      (int):      Number of UAVs painting at once, the path is split into up to that many balanced pieces.
+        boxShape    (array):    1x3 float array with the aerodynamical downwash effect constraints along the x, y and z axis, needed if drones > 1.
+        compress    (float):    Optional position error tolerance in meters, if set the timed path is fitted with piecewise polynomials and packed in a binary segment file, see polyCompression.
+        profiler    (object):   Optional stageProfiler instance, its JSON report is saved next to the waypoints.
+        binary      (bool):     Set to also export the waypoints and run parameters in a memory-mappable binary file, see binaryExport.
         
-        cnt_scaled  (list):     List of processed contours.
+        cnt_points  (array):    n x 2 float array with the points of every processed contour.
+        cnt_offsets (array):    Contour i spans cnt_points[cnt_offsets[i]:cnt_offsets[i + 1]].
         wpts        (list):     List of k x 3 waypoints matrix plus additional columns.
         distance    (float):    Total flight distance.
         Time        (float):    Total flight time.
+        trajectory  (object):   Time-parameterized path from the take off point, set if rate or compress is set.
+        segments    (list):     Piecewise polynomial segments of the trajectory, set if compress is set.
+        upload      (dict):     Simulated radio upload stats of the waypoints CSV and of the segments, set if compress is set.
+        pieces      (list):     Waypoints of each UAV in its lane, landing included, set if drones > 1.
+        piece_stats (list):     Lane, waypoint count, distance and time of each UAV, set if drones > 1.
 
     Methods:
         clean_waypoints():
             Removes waypoints that are at a certain distance from each other according to a detail parameter.
-        update(numb, x, y, line):
-            Helper function to animate the video.
-        calculate_stats():
-            Calculate flight metrics such as total distance and time.
+        calculate_stats(wpts=None):
+            Calculate flight metrics such as total distance and time, of the given waypoints if set.
+        partition(k):
+            Split the path into k contiguous pieces so the longest piece (take off and landing included) is as short as possible.
+        separate(starts, ends):
+            Assign each piece a depth lane so pieces whose work areas come within boxShape never share one.
+        assign_drones(k):
+            Split the path into as many pieces, up to k, as fit in the lanes without conflicts.
+        split_pieces(starts, ends, lanes):
+            Build each UAV's waypoints, in its lane and with its landing, and their stats.
+        get_trajectory():
+            Time-parameterize the path from the take off point under the speed and acceleration limits.
         save():
             If set computes animation, saves files to set location and prints summary.
+        plot_path():
+            Plot a figure with the UAV path.
+        plot():
+            Plot every figure of the pipeline.
     """
 
-    def __init__(self, dims, in_path, out_path, detail=0.05, speed=1.0, sleepTime=1.5, video=False, led=False):
-        super().__init__(dims, in_path, led)
+    def __init__(self, dims, in_path, out_path, detail=0.05, speed=1.0, sleepTime=1.5, video=False, led=False, headless=False, cache=None, simplify=None, order=False, binary=False, pyramid=False, profiler=None, rate=None, accel=1.0, fps=20, points_per_frame=1, compress=None, drones=1, boxShape=None):
+        super().__init__(dims, in_path, led, headless,
+                         cache, simplify, detail, pyramid, profiler)
 
         self.dims, self.in_path, self.out_path = dims, in_path, out_path
         self.detail, self.speed, self.sleepTime, self.video, self.led = detail, speed, sleepTime, video, led
+        self.order, self.binary, self.rate, self.accel = order, binary, rate, accel
+        self.fps, self.points_per_frame, self.compress = fps, points_per_frame, compress
+        self.drones, self.boxShape = drones, None if boxShape is None else np.array(boxShape)
+        if self.drones > 1 and self.boxShape is None:
+            raise ValueError("boxShape is needed to paint with more than one UAV.")
 
-        self.wpts = self.get_waypoints()
-        self.clean_waypoints()
+        # Visit the contours in the order that minimizes the off-contour travel.
+        if self.order == True:
+            with self.profiler.stage('order_contours', contours=len(self.cnt_offsets) - 1):
+                self.cnt_points, self.cnt_offsets = self.order_contours()
 
-        self.distance, self.Time = self.calculate_stats()
-        self.save()
+        with self.profiler.stage('get_waypoints') as rec:
+            self.wpts = self.get_waypoints()
+            rec['waypoints'] = len(self.wpts)
+        with self.profiler.stage('clean_waypoints', waypoints_in=len(self.wpts)) as rec:
+            self.clean_waypoints()
+            rec['waypoints'] = len(self.wpts)
 
-        self.plot_contour_inspection(self.wpts)
+        with self.profiler.stage('calculate_stats'):
+            self.distance, self.Time = self.calculate_stats()
+        if self.drones > 1:
+            with self.profiler.stage('partition', drones=self.drones) as rec:
+                starts, ends, lanes = self.assign_drones(self.drones)
+                self.split_pieces(starts, ends, lanes)
+                rec.update(pieces=len(starts), lanes=int(np.max(lanes)) + 1)
+        if self.rate is not None or self.compress is not None:
+            with self.profiler.stage('get_trajectory'):
+                self.trajectory = self.get_trajectory()
+        if self.compress is not None:
+            from crazyKhoreia.polyCompression import compress
+
+            with self.profiler.stage('compress_trajectory', tolerance=self.compress) as rec:
+                self.segments = compress(self.trajectory, self.compress)
+                rec['segments'] = len(self.segments)
+        with self.profiler.stage('save'):
+            self.save()
+        if self.profiler.enabled == True:
+            self.profiler.save(self.out_path + os.path.basename(self.in_path).split('.', 1)[0] +
+                               '_lp_report.json')
+
+        if self.headless == False:
+            from matplotlib import pyplot as plt
 
-        plt.show()
+            self.plot()
+            plt.show()
 
     def clean_waypoints(self):
-        # Clean wayPoints by a detail parameter.
-        initialPoints = len(self.wpts)
-
-        for j in range(0, 10):
-            for i in range(1, initialPoints):
-                if ((i + 1 == len(self.wpts)) | (i == len(self.wpts))):
-                    break
-                elif self.led == True:
-                    if (np.linalg.norm(self.wpts[:, 0:3][i - 1] - self.wpts[:, 0:3][i]) < self.detail) & (self.wpts[:, 3][i] == 1):
-                        self.wpts = np.delete(self.wpts, i, 0)
-                elif self.led == False:
-                    if (np.linalg.norm(self.wpts[:, 0:3][i - 1] - self.wpts[:, 0:3][i]) < self.detail):
-                        self.wpts = np.delete(self.wpts, i, 0)
-
-    def update(self, num, x, y, line):
-        line.set_data(x[:num], y[:num])
-        return line,
-
-    def calculate_stats(self):
-        distance = 0
-        takeOffHeight = self.wpts[0][2]
+        # Clean wayPoints by a detail parameter, in a single pass every point closer than
+        # detail to the last kept point is dropped. The first and last points are always kept
+        # and, if LED control is set, so are the contour start points (LED off).
+        points = self.wpts[:, 0:3].tolist()
+        if self.led == True:
+            anchors = (self.wpts[:, 3] != 1).tolist()
+        else:
+            anchors = [False]*len(points)
+
+        keep = np.zeros(shape=(len(points),), dtype=bool)
+        keep[0] = keep[-1] = True
+        detail2 = self.detail**2
+        lx, ly, lz = points[0]
+
+        for i in range(1, len(points) - 1):
+            x, y, z = points[i]
+            if anchors[i] or (x - lx)**2 + (y - ly)**2 + (z - lz)**2 >= detail2:
+                keep[i] = True
+                lx, ly, lz = x, y, z
+
+        self.wpts = self.wpts[keep]
+
+    def calculate_stats(self, wpts=None):
+        wpts = self.wpts if wpts is None else wpts
+        takeOffHeight = wpts[0][2]
         initialPos = np.array(
-            self.wpts[:, 0:3][0] - np.array([0, 0, takeOffHeight]))
+            wpts[:, 0:3][0] - np.array([0, 0, takeOffHeight]))
 
-        for i in range(0, len(self.wpts)):
-            if i == 0:
-                distance += abs(np.linalg.norm(initialPos -
-                                self.wpts[:, 0:3][0]))
-            else:
-                distance += abs(np.linalg.norm(
-                    self.wpts[:, 0:3][i - 1] - self.wpts[:, 0:3][i]))
+        # Take off distance plus the length of every segment between waypoints.
+        distance = np.linalg.norm(initialPos - wpts[:, 0:3][0]) + \
+            np.sum(np.linalg.norm(np.diff(wpts[:, 0:3], axis=0), axis=1))
 
         Time = distance/self.speed*self.sleepTime
 
         return distance, Time
 
+    def partition(self, k):
+        # A piece from waypoint a to b flies its take off, the path between them and its landing,
+        # S[b] - S[a] + z[a] + z[b], and consecutive pieces share their split waypoint so no stroke is lost.
+        # The height never changes faster than the path length, so S + z and S - z are non-decreasing: the
+        # greedy split (each piece as long as B allows, found by a binary search over S + z) uses the fewest
+        # pieces for a bottleneck B, and B is bisected down to the smallest value that needs at most k pieces.
+        S = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(self.wpts[:, 0:3], axis=0), axis=1))])
+        z, last = self.wpts[:, 2], len(self.wpts) - 1
+        reach = np.maximum.accumulate(S + z)
+
+        def split(B):
+            starts, a = [], 0
+            while(a < last or not starts):
+                b = min(np.searchsorted(reach, S[a] - z[a] + B, side='right') - 1, last)
+                if (b <= a and a < last) or len(starts) == k:
+                    return None
+                starts.append(a)
+                a = max(b, a)
+            return starts
+
+        # The whole path in one piece, padded so rounding never makes it infeasible.
+        lo, hi = 0.0, (S[-1] + z[0] + z[-1])*(1 + 1e-9)
+        starts = split(hi)
+        for _ in range(64):
+            if hi - lo <= 1e-9*max(hi, 1.0):
+                break
+            mid = (lo + hi)/2
+            candidate = split(mid)
+            if candidate is None:
+                lo = mid
+            else:
+                hi, starts = mid, candidate
+
+        starts = np.array(starts, dtype=np.intp)
+        ends = np.append(starts[1:], last)
+
+        return starts, ends
+
+    def separate(self, starts, ends):
+        from crazyKhoreia._layeredSeparation import color_layers
+
+        # Work area of each piece on the painting plane: its bounding box down to the ground, where it takes
+        # off below its first point and lands below its last one.
+        lo = np.array([np.min(self.wpts[a:b + 1, 1:3], axis=0) for a, b in zip(starts, ends)])
+        hi = np.array([np.max(self.wpts[a:b + 1, 1:3], axis=0) for a, b in zip(starts, ends)])
+        lo[:, 1] = np.minimum(lo[:, 1], 0.0)
+
+        # Pieces whose work areas come within boxShape of each other conflict and get different lanes.
+        gap = np.maximum(lo[:, None, :] - hi[None, :, :], lo[None, :, :] - hi[:, None, :])
+        close = np.all(gap < self.boxShape[1:3], axis=2)
+        np.fill_diagonal(close, False)
+        u, v = np.nonzero(close)
+        lanes, _ = color_layers(len(starts), u, v)
+
+        # Depth lanes are one box length apart towards MIN_X, as many as fit in dims.
+        num_lanes = max(1, int(np.floor((self.wpts[0, 0] - self.dims[0][0])/self.boxShape[0] + 1e-9)) + 1)
+
+        return lanes, num_lanes
+
+    def assign_drones(self, k):
+        # Every UAV flies at once, so the pieces must fit in the lanes. The longest piece only grows with
+        # fewer pieces, so the first piece count from k down whose lanes fit is the best one.
+        for num_pieces in range(k, 0, -1):
+            starts, ends = self.partition(num_pieces)
+            lanes, num_lanes = self.separate(starts, ends)
+            if np.max(lanes) < num_lanes:
+                break
+        if len(starts) < k:
+            print("Only " + str(len(starts)) + " of " + str(k) + " UAVs fit in " + str(num_lanes) +
+                  " lanes without conflicts.")
+
+        return starts, ends, lanes
+
+    def split_pieces(self, starts, ends, lanes):
+        # Each UAV takes off below its first waypoint, paints its piece in its lane and lands below its last one.
+        self.pieces, self.piece_stats = [], []
+        for a, b, lane in zip(starts, ends, lanes):
+            piece = np.vstack([self.wpts[a:b + 1], self.wpts[b]])
+            piece[-1, 2] = 0.0
+            piece[:, 0] -= lane*self.boxShape[0]
+            if self.led == True:
+                piece[0, 3] = piece[-1, 3] = 0
+            self.pieces.append(piece)
+
+            distance, Time = self.calculate_stats(piece)
+            self.piece_stats.append(dict(lane=int(lane), waypoints=len(piece), distance=distance, Time=Time))
+
+    def get_trajectory(self):
+        from crazyKhoreia.trajectory import trajectory
+
+        # Start from the ground below the first waypoint, the LED stays off during take off.
+        takeOffHeight = self.wpts[0][2]
+        points = np.vstack([self.wpts[0, 0:3] - np.array([0, 0, takeOffHeight]),
+                            self.wpts[:, 0:3]])
+        led = np.concatenate(
+            [[0, 0], self.wpts[1:, 3]]) if self.led == True else None
+
+        return trajectory(points, self.speed, self.accel, led, self.rate)
+
     def save(self):
         file_name = os.path.basename(self.in_path)
         name = file_name.split('.', 1)[0]
@@ -100,26 +265,56 @@ class lightPainting(crazyKhoreia):
         Y = self.wpts[:, 1]
         Z = self.wpts[:, 2]
 
-        # Plot points.
-        fig2, ax1 = plt.subplots()
-        ax1.plot(self.wpts[:, 1], self.wpts[:, 2], 'o',
-                 c='blueviolet', label="waypoints.")
-        ax1.plot(Y, Z, color='#570861')
-        ax1.set_title("UAV path.")
-
-        fig, ax = plt.subplots()
-        line, = ax.plot(Y, Z, color='#570861')
-        ax.set_title("UAV path animation.")
-
         if self.video == True:
-            ani = animation.FuncAnimation(fig, self.update, len(Y), fargs=[Y, Z, line],
-                                          interval=50, blit=True)
-            ani.save(self.out_path + name + '_lp_video.mp4')
-            plt.show()
+            from crazyKhoreia.pathVideo import render_path
+
+            render_path(self.out_path + name + '_lp_video.mp4', self.wpts[:, 1:3],
+                        led=self.wpts[:, 3] if self.led == True else None, fps=self.fps,
+                        points_per_frame=self.points_per_frame)
 
         np.savetxt(self.out_path + name +
                    '_lp_wpts.csv', self.wpts, delimiter=",")
 
+        # One waypoints file per UAV plus the partition summary.
+        if self.drones > 1:
+            for i, piece in enumerate(self.pieces):
+                np.savetxt(self.out_path + name + '_lp_wpts_' +
+                           str(i) + '.csv', piece, delimiter=",")
+            columns = ['lane', 'waypoints', 'distance', 'Time']
+            np.savetxt(self.out_path + name + '_lp_partition.csv',
+                       [[i] + [stats[c] for c in columns]
+                        for i, stats in enumerate(self.piece_stats)],
+                       delimiter=",", header="uav," + ",".join(columns), comments='',
+                       fmt=['%d', '%d', '%d', '%.6f', '%.6f'])
+
+        if self.binary == True:
+            from crazyKhoreia.binaryExport import save_binary
+
+            arrays = dict(waypoints=self.wpts[:, 0:3])
+            if self.led == True:
+                arrays['led'] = self.wpts[:, 3].astype(np.uint8)
+            params = dict(mode='lightPainting', in_path=self.in_path, dims=self.dims, detail=self.detail,
+                          speed=self.speed, sleepTime=self.sleepTime, led=self.led, simplify=self.simplify,
+                          order=self.order, distance=self.distance, Time=self.Time)
+            save_binary(self.out_path + name + '_lp.ckb', arrays, params)
+
+        # Stream the setpoints to disk chunk by chunk.
+        if self.rate is not None:
+            with open(self.out_path + name + '_lp_setpoints.csv', 'w') as f:
+                self.trajectory.write(f, self.rate)
+
+        # Pack the polynomial segments and compare both uploads on the simulated radio link.
+        if self.compress is not None:
+            from crazyKhoreia.polyCompression import mockLink, pack
+
+            data = pack(self.segments)
+            with open(self.out_path + name + '_lp_poly.bin', 'wb') as f:
+                f.write(data)
+            with open(self.out_path + name + '_lp_wpts.csv', 'rb') as f:
+                raw = f.read()
+            self.upload = dict(csv=mockLink().upload(0, raw),
+                               poly=mockLink().upload(0, data))
+
         minCoords = np.array([min(X), min(Y), min(Z)])
         maxCoords = np.array([max(X), max(Y), max(Z)])
         takeOffHeight = self.wpts[0][2]
@@ -135,5 +330,35 @@ class lightPainting(crazyKhoreia):
               "\nNumber of waypoints: " + str(len(self.wpts)) + \
               "\nTotal distance: " + str(self.distance) + " meters." + \
               "\nTotal time: " + str(datetime.timedelta(seconds=self.Time))
+        if self.rate is not None:
+            msg += "\nTrajectory duration: " + str(datetime.timedelta(seconds=self.trajectory.duration)) + \
+                " (" + str(self.rate) + " Hz setpoints)."
+        if self.drones > 1:
+            msg += "\nUAVs: " + str(len(self.pieces)) + " in " + str(max(stats['lane'] for stats in self.piece_stats) + 1) + \
+                " lanes, show time: " + str(datetime.timedelta(seconds=max(stats['Time'] for stats in self.piece_stats))) + "."
+            for i, stats in enumerate(self.piece_stats):
+                msg += "\nUAV " + str(i) + ": lane " + str(stats['lane']) + ", " + str(stats['waypoints']) + " waypoints, " + \
+                    str(round(stats['distance'], 3)) + " meters, " + str(datetime.timedelta(seconds=stats['Time'])) + "."
+        if self.compress is not None:
+            csv, poly = self.upload['csv'], self.upload['poly']
+            msg += "\nPolynomial segments: " + str(len(self.segments)) + " (" + str(poly['bytes']) + " bytes, " + \
+                str(round(csv['bytes']/max(poly['bytes'], 1), 1)) + "x smaller than the waypoints CSV)." + \
+                "\nSimulated upload time: " + str(round(poly['airtime'], 2)) + " s (waypoints CSV: " + \
+                str(round(csv['airtime'], 2)) + " s)."
 
         print(msg)
+
+    def plot_path(self):
+        from matplotlib import pyplot as plt
+
+        # Plot points.
+        fig, ax = plt.subplots()
+        ax.plot(self.wpts[:, 1], self.wpts[:, 2], 'o',
+                c='blueviolet', label="waypoints.")
+        ax.plot(self.wpts[:, 1], self.wpts[:, 2], color='#570861')
+        ax.set_title("UAV path.")
+
+    def plot(self):
+        super().plot()
+        self.plot_path()
+        self.plot_contour_inspection(self.wpts)
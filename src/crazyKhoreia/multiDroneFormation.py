@@ -1,15 +1,10 @@
 #!/usr/bin/env python3
 
 import os
-from itertools import combinations
+import time
 
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from scipy.spatial.distance import cdist
-from sklearn.cluster import KMeans
 
-from crazyKhoreia._3DIoU import _3DIoU
 from crazyKhoreia.crazyKhoreia import crazyKhoreia
 
 
@@ -23,71 +18,231 @@ class multiDroneFormation(crazyKhoreia):
         out_path            (str):      File output path.
         num_drones          (int):      Number of UAVs in swarm.
 
+        headless            (bool):     Set to compute and save results without creating any figure, plots remain available on demand.
+        cache               (object):   Optional contourCache instance to reuse the contour extraction results of previous runs.
+        simplify            (str):      Optional contour simplification: 'dp', 'curvature' or 'arclength'.
+        resolution          (float):    Simplification tolerance or sample spacing in meters.
+        solver              (str):      Separation solver, 'greedy' (getIoUsppd, moves the worst UAV one step at a time) or 'layered' (layeredSeparation, assigns every UAV a depth layer at once).
+        stagger             (bool):     Set to resolve the transition conflicts with staggered start delays.
+        pyramid             (bool):     Set to decode large images at a working resolution chosen from dims and resolution.
+        rate                (float):    Optional setpoint rate in Hz, if set the transition's timed setpoint stream (position and velocity) is exported.
+        speed               (float):    UAV maximum velocity for the setpoint stream.
+        accel               (float):    UAV maximum acceleration for the setpoint stream.
+        video               (bool):     Set to export a video of the transition from the initial grid to the formation.
+        fps                 (int):      Video frame rate.
+        profiler            (object):   Optional stageProfiler instance, its JSON report is saved next to the positions.
+        binary              (bool):     Set to also export the positions and run parameters in a memory-mappable binary file, see binaryExport.
+
         led                 (bool):     Whether or not to control LED light relative to out of contour travel. TODO: Is this really necessary?
-        cnt_scaled          (array):    Array of processed contours.
+        wayPoints           (array):    Waypoints matrix of the processed contours.
+        cluster_engine      (str):      Clustering engine, 'kmeans' (default), 'minibatch', 'subsample' (k-means++ on a stratified subsample) or 'arclength'.
+        labels              (array):    Cluster label of each waypoint.
+        cluster_time        (float):    Wall time of the last clustering, in seconds.
+        cluster_inertia     (float):    Sum of squared distances from each waypoint to its centroid for the last clustering.
+        cnt_points          (array):    n x 2 float array with the points of every processed contour.
+        cnt_offsets         (array):    Contour i spans cnt_points[cnt_offsets[i]:cnt_offsets[i + 1]].
         initialGrid         (array):    Array containing the initial drone configuration on ground.
         idealPositions      (array):    Array of ideal formation positions without aerodynamical constraints.
         adjustedPositions   (array):    Array of adjusted positions according to aerodynamical effects.
+        iou_stats           (dict):     Iteration count, mean and maximum iteration time of the separation solver.
+        conflicts           (array):    Pairs of UAVs whose boxes overlap while flying from the initial grid to their assignments.
+        conflictTimes       (array):    First conflict time of each pair, as a fraction of the transition duration.
+        startDelays         (array):    Start delay of each UAV, as a fraction of the transition duration.
+        transitionTime      (float):    Transition duration in seconds, start delays included, set if rate is set.
 
     Methods:
-        get_clusters(wayPoints):
+        configure(dims, boxShape, in_path, out_path, num_drones, ...):
+            Set the attributes, without reading the image.
+        run():
+            Run the pipeline on the loaded contours, from the waypoints to the saved positions.
+        get_clusters(wayPoints, init=None, engine=None):
             Get a cluster centroids array from a waypoint matrix, the number of clusters equals the number of UAVs in swarm.
+            If set, init holds the initial centroids and engine overrides cluster_engine.
+        arclength_samples(points, num_samples):
+            Sample points evenly spaced along the contours' arc length.
+        compare_clusters(wayPoints):
+            Run every clustering engine and report its time and inertia delta against KMeans (None if its inertia is zero), the current clustering is kept.
         get_idealPositions(cc):
-            Obtain the ideal positions from the cluster centroids and visualize them.
+            Obtain the ideal positions from the cluster centroids.
         getIoUsppd():
             An iterative cycle that evaluates the Intersection over the Union of a pair of UAVs and correct their position along the perpendicular axis to avoid inter-drone collisions.
+        layeredSeparation():
+            Assign every UAV a depth layer along the perpendicular axis so overlapping UAVs never share one, in a few parallel rounds.
+        check_transition():
+            Check the straight paths from the initial grid to the assignments for inter-drone collisions and, if set, stagger their start.
         save():
             Export the positions in a .csv file.
+        plot_clusters():
+            Plot the waypoints colored by cluster and the cluster centroids.
+        plot_idealPositions():
+            Plot the ideal formation.
+        visualize():
+            Plot the ideal and adjusted positions, the initial grid and the flight paths.
+        plot():
+            Plot every figure of the pipeline.
 
     """
 
-    def __init__(self, dims, boxShape, in_path, out_path, num_drones):
-        super().__init__(dims, in_path, led=False)
-
-        self.dims, self.boxShape, self.in_path, self.out_path = np.array(
-            dims), np.array(boxShape), in_path, out_path
-        self.num_drones = num_drones
-
-        wayPoints = self.get_waypoints()
-        self.plot_contour_inspection(wayPoints)
+    def __init__(self, dims, boxShape, in_path, out_path, num_drones, headless=False, cache=None, cluster_engine='kmeans', simplify=None, resolution=0.05, stagger=False, binary=False, pyramid=False, profiler=None, solver='greedy', rate=None, speed=1.0, accel=1.0, video=False, fps=20):
+        self.configure(dims, boxShape, in_path, out_path, num_drones, headless, cache, cluster_engine, simplify,
+                       resolution, stagger, binary, pyramid, profiler, solver, rate, speed, accel, video, fps)
+        self.load_contours()
+        self.run()
+
+    def configure(self, dims, boxShape, in_path, out_path, num_drones, headless=False, cache=None, cluster_engine='kmeans', simplify=None, resolution=0.05, stagger=False, binary=False, pyramid=False, profiler=None, solver='greedy', rate=None, speed=1.0, accel=1.0, video=False, fps=20):
+        super().configure(np.array(dims), in_path, led=False, headless=headless, cache=cache,
+                          simplify=simplify, resolution=resolution, pyramid=pyramid, profiler=profiler)
+
+        self.boxShape = None if boxShape is None else np.array(boxShape)
+        self.out_path = out_path
+        self.num_drones, self.cluster_engine, self.stagger = num_drones, cluster_engine, stagger
+        self.binary, self.solver = binary, solver
+        self.rate, self.speed, self.accel = rate, speed, accel
+        self.video, self.fps = video, fps
+
+    def run(self):
+        with self.profiler.stage('get_waypoints') as rec:
+            self.wayPoints = self.get_waypoints()
+            rec['waypoints'] = len(self.wayPoints)
+
+        with self.profiler.stage('estimateInitialGrid', num_drones=self.num_drones):
+            self.initialGrid = self.estimateInitialGrid()
+        with self.profiler.stage('get_clusters', engine=self.cluster_engine, num_drones=self.num_drones) as rec:
+            cc = self.get_clusters(self.wayPoints)
+            self.idealPositions = self.get_idealPositions(cc)
+            rec['inertia'] = self.cluster_inertia
+        with self.profiler.stage('getIoUsppd', solver=self.solver) as rec:
+            self.adjustedPositions = self.getIoUsppd()
+            self.centerPositions()
+            rec.update(self.iou_stats)
+        with self.profiler.stage('dronePositionAssignment'):
+            self.droneAssignments = self.dronePositionAssignment()
+        with self.profiler.stage('check_transition', stagger=self.stagger) as rec:
+            self.conflicts, self.conflictTimes, self.startDelays = self.check_transition()
+            rec['conflicts'] = len(self.conflicts)
+
+        with self.profiler.stage('save'):
+            self.save()
+        if self.profiler.enabled == True:
+            self.profiler.save(self.out_path + os.path.basename(self.in_path).split('.', 1)[0] +
+                               '_mdf_report.json')
+
+        if self.headless == False:
+            from matplotlib import pyplot as plt
+
+            self.plot()
+            plt.show()
+
+    def get_clusters(self, wayPoints, init=None, engine=None):
+        from scipy.spatial import cKDTree
+
+        engine = self.cluster_engine if engine is None else engine
+        points = np.array([wayPoints[:, 1], wayPoints[:, 2]]).T
+        start = time.perf_counter()
+
+        if engine == 'kmeans':
+            from sklearn.cluster import KMeans
+
+            # Warm start from the given centroids (e.g. the previous frame's ones) if any.
+            if init is not None:
+                kmeans = KMeans(
+                    n_init=1, n_clusters=self.num_drones, init=init, random_state=0)
+            else:
+                kmeans = KMeans(
+                    n_init=10, n_clusters=self.num_drones, random_state=0)
+            cc = kmeans.fit(points).cluster_centers_
+        elif engine == 'minibatch':
+            from sklearn.cluster import MiniBatchKMeans
+
+            kmeans = MiniBatchKMeans(n_clusters=self.num_drones, init='k-means++' if init is None else init,
+                                     n_init=3 if init is None else 1, batch_size=max(1024, 10*self.num_drones), random_state=0)
+            cc = kmeans.fit(points).cluster_centers_
+        elif engine == 'subsample':
+            from sklearn.cluster import KMeans
+
+            # Stratified subsample, evenly strided along the contours so every contour keeps
+            # a share of points proportional to its length.
+            size = min(len(points), max(5000, 20*self.num_drones))
+            idx = np.linspace(0, len(points) - 1, size).astype(int)
+            kmeans = KMeans(n_clusters=self.num_drones, init='k-means++' if init is None else init,
+                            n_init=3 if init is None else 1, random_state=0)
+            cc = kmeans.fit(points[idx]).cluster_centers_
+        elif engine == 'arclength':
+            cc = self.arclength_samples(points, self.num_drones)
+        else:
+            raise ValueError("Unknown clustering engine: " + str(engine))
+
+        # Label every waypoint with its nearest centroid and measure the clustering quality.
+        dist, self.labels = cKDTree(cc).query(points)
+        self.cluster_time = time.perf_counter() - start
+        self.cluster_inertia = np.sum(dist**2)
 
-        self.initialGrid = self.estimateInitialGrid()
-        cc = self.get_clusters(wayPoints)
-        self.idealPositions = self.get_idealPositions(cc)
-        self.adjustedPositions = self.getIoUsppd()
-        self.centerPositions()
-        self.droneAssignments = self.dronePositionAssignment()
-
-        self.visualize()
-        self.save()
+        return cc
 
-        plt.show()
+    def arclength_samples(self, points, num_samples):
+        # Contours are closed, so each point is joined to the next one and the last point back to the first.
+        nxt = np.arange(1, len(points) + 1)
+        nxt[self.cnt_offsets[1:] - 1] = self.cnt_offsets[:-1]
+        seg = np.linalg.norm(points[nxt] - points, axis=1)
+        cum = np.cumsum(seg)
+
+        # Place the samples evenly along the total contour length, without crossing between contours.
+        targets = (np.arange(num_samples) + 0.5)*cum[-1]/num_samples
+        i = np.minimum(np.searchsorted(cum, targets, side='right'),
+                       len(points) - 1)
+        frac = (targets - (cum[i] - seg[i]))/np.where(seg[i] > 0, seg[i], 1)
+
+        return points[i] + frac[:, None]*(points[nxt[i]] - points[i])
+
+    def compare_clusters(self, wayPoints, engines=('kmeans', 'minibatch', 'subsample', 'arclength')):
+        # Run every clustering engine and report its time and quality against the KMeans baseline.
+        # The current clustering results are kept.
+        saved = {k: self.__dict__[k] for k in ('labels', 'cluster_time', 'cluster_inertia')
+                 if k in self.__dict__}
+        report = {}
+        try:
+            for engine in engines:
+                self.get_clusters(wayPoints, engine=engine)
+                report[engine] = {'time': self.cluster_time,
+                                  'inertia': self.cluster_inertia}
+        finally:
+            self.__dict__.update(saved)
+
+        # A zero baseline inertia (as many points as UAVs) has no relative delta.
+        baseline = report.get('kmeans', report[engines[0]])['inertia']
+        for engine, stats in report.items():
+            stats['inertia_delta'] = (stats['inertia'] - baseline)/baseline if baseline > 0 else None
+            delta = "n/a" if stats['inertia_delta'] is None else str(round(100*stats['inertia_delta'], 2)) + " %"
+            print(engine + ": " + str(round(stats['time'], 3)) + " s, inertia delta " + delta + ".")
+
+        return report
+
+    def plot_clusters(self):
+        from matplotlib import pyplot as plt
+
+        cc = self.idealPositions[:, 1:3]
 
-    def get_clusters(self, wayPoints):
         fig, ax0 = plt.subplots()
-        kmeans = KMeans(
-            n_init=10, n_clusters=self.num_drones, random_state=0)
-        y_pred = kmeans.fit_predict(
-            np.array([wayPoints[:, 1], wayPoints[:, 2]]).T)
-        cc = kmeans.cluster_centers_
-
-        ax0.scatter(wayPoints[:, 1], wayPoints[:, 2], c=y_pred)
+        ax0.scatter(self.wayPoints[:, 1], self.wayPoints[:, 2], c=self.labels)
         ax0.plot(cc[:, 0], cc[:, 1], 'o', c='violet',
                  label='Cluster centroids.')
         ax0.legend()
         ax0.set_title("KMeans clusters.")
 
-        return cc
-
     def get_idealPositions(self, cc):
         idealPositions = np.empty(shape=(0, 3))
 
         idealPositions = np.array(
             [(self.dims[0][2])*np.ones(shape=(len(cc),)), cc[:, 0], cc[:, 1]]).T
 
-        xs = idealPositions[:, 0]
-        ys = idealPositions[:, 1]
-        zs = idealPositions[:, 2]
+        return idealPositions
+
+    def plot_idealPositions(self):
+        from matplotlib import pyplot as plt
+
+        xs = self.idealPositions[:, 0]
+        ys = self.idealPositions[:, 1]
+        zs = self.idealPositions[:, 2]
 
         fig = plt.figure()
         ax = fig.add_subplot(projection='3d')
@@ -99,33 +254,37 @@ class multiDroneFormation(crazyKhoreia):
         ax.set_ylabel("Y")
         ax.set_zlabel("Z")
 
-        return idealPositions
-
     def getIoUsppd(self):
-        adjustedPositions = np.array(self.idealPositions)
+        from crazyKhoreia._IoUTable import _IoUTable
 
-        while(1):
-            print("Minimizing IoU ...")
-            combs = combinations(range(0, self.num_drones), 2)
-            UAV_IoU = np.zeros(shape=(self.num_drones, 1))
+        if self.solver == 'layered':
+            return self.layeredSeparation()
+        elif self.solver != 'greedy':
+            raise ValueError("Unknown separation solver: " + str(self.solver))
 
-            for i in combs:
-                box1 = [self.boxShape, 0,
-                        adjustedPositions[i[0]]/np.array([1, 1, 2])]
-                box2 = [self.boxShape, 0,
-                        adjustedPositions[i[1]]/np.array([1, 1, 2])]
-                IoU = _3DIoU(box1, box2)
+        adjustedPositions = np.array(self.idealPositions)
 
-                UAV_IoU[i[0]] += IoU.IOU_3d
-                UAV_IoU[i[1]] += IoU.IOU_3d
+        # Persistent pair table, each step only updates the pairs of the moved UAV.
+        table = _IoUTable(adjustedPositions/np.array([1, 1, 2]), self.boxShape)
+        maxX = max(adjustedPositions[:, 0])
 
-            maxIoU = max(UAV_IoU)
-            maxUAV = np.where(UAV_IoU == maxIoU)[0][0]
+        # Iteration count and cost, reported by the profiler.
+        iterations, start, slowest = 0, time.perf_counter(), 0.0
+        while(1):
+            tic = time.perf_counter()
+            print("Minimizing IoU ...")
+            maxUAV = np.argmax(table.UAV_IoU)
+            maxIoU = table.UAV_IoU[maxUAV]
             print("Maximum IoU: " + str(maxIoU))
+            self.profiler.update('getIoUsppd', iterations=iterations, maxIoU=maxIoU)
 
             if maxIoU != 0:
-                if max(adjustedPositions[:, 0]) <= self.dims[1][2]:
+                if maxX <= self.dims[1][2]:
                     adjustedPositions[maxUAV][0] += self.boxShape[0]
+                    table.move(maxUAV, [self.boxShape[0], 0, 0])
+                    maxX = max(maxX, adjustedPositions[maxUAV][0])
+                    iterations += 1
+                    slowest = max(slowest, time.perf_counter() - tic)
                 else:
                     print("Formation for " + str(self.num_drones) + " UAVs failed at UAV " + str(
                         maxUAV) + " depth limitations exceeded, please lower the number of UAVs.")
@@ -134,6 +293,51 @@ class multiDroneFormation(crazyKhoreia):
                 print("Interception free formation found.")
                 break
 
+        total = time.perf_counter() - start
+        self.iou_stats = dict(iterations=iterations, iteration_mean=total/max(iterations, 1),
+                              iteration_max=slowest, converged=bool(maxIoU == 0))
+
+        return adjustedPositions
+
+    def layeredSeparation(self):
+        from crazyKhoreia._layeredSeparation import color_layers, overlap_edges
+
+        start = time.perf_counter()
+        adjustedPositions = np.array(self.idealPositions)
+
+        # UAVs only move along X by whole box lengths, so a formation is a depth layer per UAV and
+        # UAVs that overlap on the Y-Z plane need different layers, a graph coloring problem.
+        centers = adjustedPositions/np.array([1, 1, 2])
+        u, v = overlap_edges(centers, self.boxShape)
+        layers, rounds = color_layers(self.num_drones, u, v)
+
+        # Any permutation of the layers is still valid, the most populated ones are kept closest to the ideal depth.
+        by_size = np.argsort(-np.bincount(layers), kind='stable')
+        rename = np.empty(shape=(len(by_size),), dtype=int)
+        rename[by_size] = np.arange(len(by_size))
+        layers = rename[layers]
+
+        # Same depth limit as getIoUsppd(), a UAV can be pushed while the deepest one is within dims.
+        minX = min(adjustedPositions[:, 0])
+        max_layer = int(np.floor((self.dims[1][2] - minX) /
+                        self.boxShape[0] + 1e-9)) + 1
+        converged = bool(np.max(layers, initial=0) <= max_layer)
+        if converged:
+            print("Interception free formation found in " + str(rounds) + " rounds, " +
+                  str(np.max(layers, initial=0) + 1) + " layers.")
+        else:
+            print("Formation for " + str(self.num_drones) + " UAVs failed, " + str(np.max(layers) + 1) +
+                  " layers needed, depth limitations exceeded, please lower the number of UAVs.")
+            layers = np.minimum(layers, max_layer)
+
+        # Layers one box length and a nanometre apart, so rounding never turns a contact into an overlap.
+        adjustedPositions[:, 0] += layers*(self.boxShape[0] + 1e-9)
+
+        total = time.perf_counter() - start
+        self.iou_stats = dict(iterations=rounds, iteration_mean=total/max(rounds, 1), iteration_max=None,
+                              converged=converged, layers=int(np.max(layers, initial=0)) + 1,
+                              moved=int(np.count_nonzero(layers)))
+
         return adjustedPositions
 
     def centerPositions(self):
@@ -176,6 +380,8 @@ class multiDroneFormation(crazyKhoreia):
             year = {2022},
         }
         """
+        from scipy.optimize import linear_sum_assignment
+        from scipy.spatial.distance import cdist
 
         # Compute the pairwise cost matrix between waypoint and drone.
         cost = np.array(cdist(self.initialGrid, self.adjustedPositions))
@@ -193,7 +399,27 @@ class multiDroneFormation(crazyKhoreia):
 
         return droneAssignments
 
+    def check_transition(self):
+        from crazyKhoreia._sweptCollision import closest_approach, stagger_delays
+
+        if self.stagger == True:
+            startDelays, conflicts, conflictTimes = stagger_delays(
+                self.initialGrid, self.droneAssignments, self.boxShape)
+        else:
+            startDelays = np.zeros(shape=(self.num_drones,))
+            conflicts, conflictTimes = closest_approach(
+                self.initialGrid, self.droneAssignments, self.boxShape)
+
+        print("Transition conflicts: " + str(len(conflicts)) + ".")
+        for (i, j), t in zip(conflicts, conflictTimes):
+            print("UAV " + str(i) + " and UAV " + str(j) +
+                  " conflict at " + str(round(t, 3)) + ".")
+
+        return conflicts, conflictTimes, startDelays
+
     def visualize(self):
+        from matplotlib import pyplot as plt
+
         # Create and set up plot.
         fig = plt.figure()
         ax = fig.add_subplot(projection='3d')
@@ -274,3 +500,40 @@ class multiDroneFormation(crazyKhoreia):
 
         np.savetxt(self.out_path + name +
                    '_mdf_wpts.csv', self.droneAssignments, delimiter=",")
+
+        if self.stagger == True:
+            np.savetxt(self.out_path + name +
+                       '_mdf_delays.csv', self.startDelays, delimiter=",")
+
+        # Stream the transition setpoints to disk chunk by chunk.
+        if self.rate is not None:
+            from crazyKhoreia.trajectory import swarm_setpoints
+
+            with open(self.out_path + name + '_mdf_setpoints.csv', 'w') as f:
+                self.transitionTime = swarm_setpoints(f, self.initialGrid, self.droneAssignments, self.rate,
+                                                      self.speed, self.accel, self.startDelays)
+            print("Transition duration: " + str(self.transitionTime) + " seconds (" + str(self.rate) +
+                  " Hz setpoints).")
+
+        if self.video == True:
+            from crazyKhoreia.pathVideo import render_swarm
+
+            render_swarm(self.out_path + name + '_mdf_video.mp4', self.initialGrid, self.droneAssignments,
+                         self.dims, self.startDelays, fps=self.fps)
+
+        if self.binary == True:
+            from crazyKhoreia.binaryExport import save_binary
+
+            arrays = dict(initial_grid=self.initialGrid, waypoints=self.droneAssignments,
+                          delays=self.startDelays, conflicts=self.conflicts)
+            params = dict(mode='multiDroneFormation', in_path=self.in_path, dims=self.dims, boxShape=self.boxShape,
+                          num_drones=self.num_drones, cluster_engine=self.cluster_engine, simplify=self.simplify,
+                          resolution=self.resolution, stagger=self.stagger)
+            save_binary(self.out_path + name + '_mdf.ckb', arrays, params)
+
+    def plot(self):
+        super().plot()
+        self.plot_contour_inspection(self.wayPoints)
+        self.plot_clusters()
+        self.plot_idealPositions()
+        self.visualize()
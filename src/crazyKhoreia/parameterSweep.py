@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+import contextlib
+import csv
+import hashlib
+import inspect
+import io
+import itertools
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from crazyKhoreia._barePipeline import bare
+
+# Pipeline parameters that are files or objects rather than values to sweep.
+EXCLUDED = ('self', 'in_path', 'out_path', 'headless', 'cache', 'profiler')
+
+
+def _contours(p):
+    from crazyKhoreia.crazyKhoreia import crazyKhoreia
+
+    obj = bare(crazyKhoreia, **p)
+    obj.img = obj.read_image()
+    obj.contours = obj.process_image()
+    obj.cnt_points, obj.cnt_offsets = obj.process_contours(obj.contours)
+    if obj.simplify is not None:
+        obj.cnt_points, obj.cnt_offsets = obj.simplify_contours()
+
+    return dict(cnt_points=obj.cnt_points, cnt_offsets=obj.cnt_offsets,
+                summary=dict(contours=len(obj.cnt_offsets) - 1))
+
+
+def _order_contours(p, contours):
+    from crazyKhoreia.crazyKhoreia import crazyKhoreia
+
+    if p['order'] != True:
+        return contours
+    obj = bare(crazyKhoreia, **p, **contours)
+    cnt_points, cnt_offsets = obj.order_contours()
+
+    return dict(cnt_points=cnt_points, cnt_offsets=cnt_offsets, summary=contours['summary'])
+
+
+def _lp_waypoints(p, contours):
+    from crazyKhoreia.lightPainting import lightPainting
+
+    obj = bare(lightPainting, **p, **contours)
+    obj.wpts = obj.get_waypoints()
+    obj.clean_waypoints()
+
+    return dict(wpts=obj.wpts, summary=dict(waypoints=len(obj.wpts)))
+
+
+def _lp_stats(p, waypoints):
+    from crazyKhoreia.lightPainting import lightPainting
+
+    obj = bare(lightPainting, **p, wpts=waypoints['wpts'])
+    distance, Time = obj.calculate_stats()
+
+    return dict(summary=dict(distance=distance, time=Time, success=True))
+
+
+def _mdf_clusters(p, contours):
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+    obj = bare(multiDroneFormation, **p, **contours)
+    wayPoints = obj.get_waypoints()
+    idealPositions = obj.get_idealPositions(obj.get_clusters(wayPoints))
+
+    return dict(idealPositions=idealPositions,
+                summary=dict(waypoints=len(wayPoints), inertia=obj.cluster_inertia))
+
+
+def _mdf_separation(p, clusters):
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+    obj = bare(multiDroneFormation, **p, **clusters)
+    obj.adjustedPositions = obj.getIoUsppd()
+    obj.centerPositions()
+
+    return dict(adjustedPositions=obj.adjustedPositions, summary=dict(converged=obj.iou_stats['converged']))
+
+
+def _mdf_grid(p):
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+    return dict(initialGrid=bare(multiDroneFormation, **p).estimateInitialGrid())
+
+
+def _mdf_assignment(p, separation, grid):
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+    obj = bare(multiDroneFormation, **p, **separation, **grid)
+
+    return dict(droneAssignments=obj.dronePositionAssignment())
+
+
+def _mdf_transition(p, assignment, grid):
+    from crazyKhoreia.multiDroneFormation import multiDroneFormation
+    from crazyKhoreia.trajectory import swarmClock
+
+    obj = bare(multiDroneFormation, **p, **assignment, **grid)
+    conflicts, _, startDelays = obj.check_transition()
+
+    # Same clock as the setpoint stream, see swarm_setpoints().
+    lengths = np.linalg.norm(obj.droneAssignments - obj.initialGrid, axis=1)
+    duration = swarmClock(obj.initialGrid, obj.droneAssignments, p['speed'], p['accel'], startDelays).duration
+
+    return dict(summary=dict(distance=np.sum(lengths), time=duration,
+                             conflicts=len(conflicts), success=True))
+
+
+def _contour_params(p):
+    # The resolution only changes the contours if they are simplified or decoded at a working resolution.
+    keys = ['in_path', 'dims', 'pyramid', 'simplify']
+    if p['simplify'] is not None or p['pyramid'] == True:
+        keys.append('resolution')
+    return keys
+
+
+# Stage graph of each pipeline, in topological order: name, function, parameters and upstream stages.
+STAGES = {
+    'lightPainting': [
+        ('contours', _contours, _contour_params, ()),
+        ('order_contours', _order_contours, ('order',), ('contours',)),
+        ('waypoints', _lp_waypoints, ('led', 'detail'), ('order_contours',)),
+        ('stats', _lp_stats, ('speed', 'sleepTime'), ('waypoints',)),
+    ],
+    'multiDroneFormation': [
+        ('contours', _contours, _contour_params, ()),
+        ('clusters', _mdf_clusters, ('num_drones', 'cluster_engine'), ('contours',)),
+        ('separation', _mdf_separation, ('boxShape', 'solver'), ('clusters',)),
+        ('grid', _mdf_grid, ('dims', 'num_drones', 'boxShape'), ()),
+        ('assignment', _mdf_assignment, (), ('separation', 'grid')),
+        ('transition', _mdf_transition, ('boxShape', 'stagger', 'speed', 'accel'), ('assignment', 'grid')),
+    ],
+}
+
+
+def run_stage(mode, name, p, inputs, quiet=True):
+    """ Run one stage of a pipeline on its upstream outputs, the exception traceback is returned instead of
+    raised so one failing point doesn't stop the sweep.
+    Output:
+        (output, error), error is None if the stage succeeded.
+    """
+    fn = {stage[0]: stage[1] for stage in STAGES[mode]}[name]
+    try:
+        if quiet == True:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return fn(p, *inputs), None
+        return fn(p, *inputs), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+class parameterSweep():
+    """
+    parameterSweep runs a pipeline over every combination of a parameter grid, as a graph of stages whose
+    outputs are memoized by the parameters they actually depend on. Changing boxShape, for example, reuses
+    the contours and clusters of the previous points. Stages that don't depend on each other run in
+    parallel across processes, level by level of the graph.
+    Attributes:
+        mode        (str):      Pipeline, either 'lightPainting' or 'multiDroneFormation'.
+        in_path     (str):      Global image's path to process.
+        grid        (dict):     Parameter name to list of values, e.g. {'boxShape': [[0.3, 0.3, 0.3], [0.4, 0.4, 0.4]]}.
+        workers     (int):      Number of worker processes, defaults to the number of CPUs, 1 runs every stage in this process.
+        quiet       (bool):     Set to silence the pipeline's prints inside the stages.
+        fixed       (dict):     Remaining pipeline parameters, the pipeline class defaults fill the rest.
+
+        memo        (dict):     Stage key to (output, error), kept across runs.
+        table       (list):     One row per grid point: its swept parameters, waypoints, distance, time, success and error.
+        stats       (dict):     Stages run, reused from the memo and total wall time of the last run.
+
+    Methods:
+        points():
+            Return the full parameter set of every grid point.
+        run():
+            Run the sweep and return the results table.
+        save(path):
+            Write the results table to a .csv file.
+    """
+
+    def __init__(self, mode, in_path, grid, workers=None, quiet=True, **fixed):
+        if mode not in STAGES:
+            raise ValueError("Unknown mode: " + str(mode))
+
+        self.mode, self.in_path, self.grid, self.workers, self.quiet = mode, in_path, dict(
+            grid), workers, quiet
+        self.fixed = fixed
+        self.memo, self.table, self.stats = {}, [], {}
+
+        # Defaults from the pipeline class signature.
+        if self.mode == 'lightPainting':
+            from crazyKhoreia.lightPainting import lightPainting as cls
+        else:
+            from crazyKhoreia.multiDroneFormation import multiDroneFormation as cls
+        signature = inspect.signature(cls.__init__).parameters
+        self.defaults = {k: v.default for k, v in signature.items()
+                         if k not in EXCLUDED and v.default is not inspect.Parameter.empty}
+        required = [k for k, v in signature.items()
+                    if k not in EXCLUDED and v.default is inspect.Parameter.empty]
+
+        unknown = [k for k in list(self.grid) + list(self.fixed)
+                   if k not in self.defaults and k not in required]
+        if unknown:
+            raise ValueError("Unknown parameters: " + str(unknown))
+        missing = [k for k in required if k not in self.grid and k not in self.fixed]
+        if missing:
+            raise ValueError("Missing parameters: " + str(missing))
+
+    def points(self):
+        names = list(self.grid)
+        points = []
+        for values in itertools.product(*(self.grid[k] for k in names)):
+            p = dict(self.defaults, **self.fixed)
+            p.update(zip(names, values))
+            p['in_path'] = self.in_path
+            # lightPainting simplifies and decodes the image at its detail resolution.
+            if self.mode == 'lightPainting':
+                p['resolution'] = p['detail']
+            points.append(p)
+
+        return points
+
+    def run(self):
+        start = time.perf_counter()
+        stages = STAGES[self.mode]
+
+        # Build the stage graph of every point, identical stages share their key and run once.
+        nodes, levels, point_keys = {}, {}, []
+        for p in self.points():
+            keys = {}
+            for name, fn, params, deps in stages:
+                names = params(p) if callable(params) else params
+                own = {k: _plain(p[k]) for k in names}
+                key = hashlib.sha1(json.dumps([name, own, [keys[d] for d in deps]],
+                                              sort_keys=True).encode()).hexdigest()
+                keys[name] = key
+                if key not in nodes:
+                    nodes[key] = (name, p, [keys[d] for d in deps])
+                    levels[key] = 1 + max([levels[keys[d]] for d in deps], default=-1)
+            point_keys.append(keys)
+
+        pending = [key for key in nodes if key not in self.memo]
+        self.stats = dict(stages=len(nodes), run=0, reused=len(nodes) - len(pending))
+
+        executor = None if self.workers == 1 else ProcessPoolExecutor(
+            max_workers=self.workers)
+        try:
+            for level in range(max(levels.values(), default=-1) + 1):
+                jobs = {}
+                for key in pending:
+                    if levels[key] != level:
+                        continue
+                    name, p, deps = nodes[key]
+
+                    # A stage downstream of a failure fails with the same error.
+                    errors = [self.memo[d][1] for d in deps if self.memo[d][1] is not None]
+                    if errors:
+                        self.memo[key] = (None, errors[0])
+                        continue
+                    inputs = [self.memo[d][0] for d in deps]
+                    if executor is None:
+                        self.memo[key] = run_stage(self.mode, name, p, inputs, self.quiet)
+                    else:
+                        jobs[key] = executor.submit(
+                            run_stage, self.mode, name, p, inputs, self.quiet)
+                    self.stats['run'] += 1
+                for key, job in jobs.items():
+                    self.memo[key] = job.result()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # One row per point, from the summaries of its stages.
+        self.table = []
+        for p, keys in zip(self.points(), point_keys):
+            row = {k: p[k] for k in self.grid}
+            row.update(waypoints=None, distance=None, time=None, success=False, error=None)
+            for name, key in keys.items():
+                output, error = self.memo[key]
+                if error is not None:
+                    row['error'] = error.strip().splitlines()[-1]
+                    break
+                row.update({k: _plain(v) for k, v in output.get('summary', {}).items()})
+            if self.mode == 'multiDroneFormation' and row['error'] is None:
+                row['success'] = bool(row['success'] and row.pop('converged'))
+            self.table.append(row)
+
+        self.stats['wall'] = time.perf_counter() - start
+        print("Parameter sweep: " + str(len(self.table)) + " points, " + str(self.stats['run']) + " stages run, " +
+              str(self.stats['reused']) + " reused, " + str(round(self.stats['wall'], 3)) + " s.")
+
+        return self.table
+
+    def save(self, path):
+        columns = list(self.grid) + ['waypoints', 'distance', 'time', 'success', 'error'] + \
+            sorted({k for row in self.table for k in row} - set(self.grid) -
+                   {'waypoints', 'distance', 'time', 'success', 'error'})
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for row in self.table:
+                writer.writerow({k: _plain(v) for k, v in row.items()})
+
+
+def _plain(value):
+    # JSON friendly parameter values, so equal parameters give equal stage keys.
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, tuple):
+        return [_plain(v) for v in value]
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
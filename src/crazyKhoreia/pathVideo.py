@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import cv2 as cv
+import numpy as np
+
+# Colors in BGR order.
+PATH_COLOR = (97, 8, 87)
+TRAVEL_COLOR = (200, 200, 200)
+UAV_COLOR = (40, 40, 220)
+BACKGROUND = 255
+
+
+def _projection(lo, hi, size, margin):
+    # Fit the [lo, hi] box into a size x size frame keeping the aspect ratio, the second axis points up.
+    lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+    scale = (size - 2*margin)/max(np.max(hi - lo), 1e-12)
+
+    def project(points):
+        points = np.asarray(points, dtype=float)
+        px = margin + (points[..., 0] - lo[0])*scale
+        py = size - margin - (points[..., 1] - lo[1])*scale
+        return np.round(np.stack([px, py], axis=-1)).astype(np.int32)
+
+    return project
+
+
+def _writer(path, fps, frame_shape):
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*'mp4v'), fps,
+                            (frame_shape[1], frame_shape[0]))
+    if not writer.isOpened():
+        raise IOError("Can't open the video writer for " + str(path))
+
+    return writer
+
+
+def render_path(path, points, led=None, fps=20, points_per_frame=1, size=540, margin=20):
+    """ Render the progressive drawing of a light painting path (Y-Z plane) into a video file.
+    The path is rasterized into a persistent frame buffer, each frame only draws its new segments.
+    Input:
+        path: output video path (.mp4).
+        points: (n,2) array of Y and Z coordinates.
+        led: optional (n,) LED state, the segments towards LED off points are drawn as light travel lines.
+        fps: frame rate.
+        points_per_frame: number of waypoints added per frame.
+        size: frame width and height in pixels.
+    Output:
+        num_frames: number of written frames.
+    """
+    points = np.asarray(points, dtype=float)
+    project = _projection(np.min(points, axis=0),
+                          np.max(points, axis=0), size, margin)
+    pixels = project(points)
+    lit = np.ones(shape=(len(points),), dtype=bool) if led is None else np.asarray(
+        led) != 0
+
+    canvas = np.full(shape=(size, size, 3), fill_value=BACKGROUND, dtype=np.uint8)
+    writer = _writer(path, fps, canvas.shape)
+    num_frames = 0
+    try:
+        for end in range(1, len(points) + points_per_frame, points_per_frame):
+            end = min(end, len(points))
+            first = max(1, end - points_per_frame)
+
+            # Draw the new segments, a segment towards an LED off point is the travel to a new contour.
+            for i in range(first, end):
+                color = PATH_COLOR if lit[i] else TRAVEL_COLOR
+                cv.line(canvas, tuple(pixels[i - 1]), tuple(pixels[i]),
+                        color, 2, cv.LINE_AA)
+
+            # The UAV marker is drawn on a copy so it doesn't leave a trail.
+            frame = canvas.copy()
+            cv.circle(frame, tuple(pixels[end - 1]), 5, UAV_COLOR, -1, cv.LINE_AA)
+            writer.write(frame)
+            num_frames += 1
+    finally:
+        writer.release()
+
+    return num_frames
+
+
+def render_swarm(path, start, end, dims, delays=None, fps=20, seconds=4.0, size=540, margin=20):
+    """ Render a swarm transition from start to end as a front view (Y-Z) and a top view (X-Y), side by side.
+    Every UAV flies its straight line at constant speed during the transition, after its start delay.
+    Input:
+        path: output video path (.mp4).
+        start, end: (N,3) arrays of initial and final positions.
+        dims: flight space, the views are fitted to it.
+        delays: optional (N,) start delays as fractions of the transition duration.
+        fps: frame rate.
+        seconds: duration of the transition in the video, the delays are added to it.
+        size: width and height of each view in pixels.
+    Output:
+        num_frames: number of written frames.
+    """
+    start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+    dims = np.asarray(dims, dtype=float)
+    delays = np.zeros(shape=(len(start),)) if delays is None else np.asarray(
+        delays, dtype=float)
+
+    # Fit both views to the flight space and every position, formations may lie outside dims.
+    lo = np.minimum(dims[0], np.minimum(np.min(start, axis=0), np.min(end, axis=0)))
+    hi = np.maximum(dims[1], np.maximum(np.max(start, axis=0), np.max(end, axis=0)))
+    front = _projection(lo[[1, 2]], hi[[1, 2]], size, margin)
+    top = _projection(lo[[0, 1]], hi[[0, 1]], size, margin)
+
+    # Static background: the goal positions and each UAV's straight path.
+    background = np.full(shape=(size, 2*size, 3),
+                         fill_value=BACKGROUND, dtype=np.uint8)
+    for view, axes, offset in ((front, [1, 2], 0), (top, [0, 1], size)):
+        a, b = view(start[:, axes]), view(end[:, axes])
+        a[:, 0] += offset
+        b[:, 0] += offset
+        for p, q in zip(a, b):
+            cv.line(background, tuple(p), tuple(q), TRAVEL_COLOR, 1, cv.LINE_AA)
+        for q in b:
+            cv.circle(background, tuple(q), 4, PATH_COLOR, 1, cv.LINE_AA)
+    cv.line(background, (size, 0), (size, size), (0, 0, 0), 1)
+
+    writer = _writer(path, fps, background.shape)
+    num_frames = int(np.ceil(seconds*(1 + np.max(delays, initial=0))*fps)) + 1
+    try:
+        for k in range(num_frames):
+            u = np.clip((k/fps/seconds - delays), 0, 1)[:, None]
+            positions = start + u*(end - start)
+
+            frame = background.copy()
+            for view, axes, offset in ((front, [1, 2], 0), (top, [0, 1], size)):
+                pixels = view(positions[:, axes])
+                pixels[:, 0] += offset
+                for p in pixels:
+                    cv.circle(frame, tuple(p), 4, UAV_COLOR, -1, cv.LINE_AA)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    return num_frames
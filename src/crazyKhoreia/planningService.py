@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+# Minimum time between two progress updates of the same stage, in seconds.
+PROGRESS_INTERVAL = 0.1
+
+# Event queue of a worker process, set by _warm_up().
+_events = None
+
+
+def _warm_up(events):
+    # Import the heavy libraries once per worker process, so jobs only pay for their own work.
+    global _events
+    _events = events
+
+    import cv2  # noqa: F401
+    import scipy.optimize  # noqa: F401
+    import scipy.spatial  # noqa: F401
+    import sklearn.cluster  # noqa: F401
+
+    import crazyKhoreia.lightPainting  # noqa: F401
+    import crazyKhoreia.multiDroneFormation  # noqa: F401
+
+
+def run_job(job_id, mode, in_path, out_path, params, cache_dir=None):
+    """ Run a pipeline on a worker process, its stage records, progress updates and, last, its done event
+    with the run summary (or its error) are sent to the service as they happen, in order.
+    """
+    try:
+        summary = _run_pipeline(job_id, mode, in_path, out_path, params, cache_dir)
+        _events.put((job_id, dict(event='done', result=summary)))
+    except Exception as e:
+        _events.put((job_id, dict(event='error', error=type(e).__name__ + ": " + str(e),
+                                  traceback=traceback.format_exc())))
+
+
+def _run_pipeline(job_id, mode, in_path, out_path, params, cache_dir):
+    from crazyKhoreia.stageProfiler import stageProfiler
+
+    last = {}
+
+    def stage_done(record):
+        _events.put((job_id, dict(event='stage', **_plain(record))))
+
+    def progress(record):
+        # Throttle the updates of fast loops such as the getIoUsppd iterations.
+        now = time.perf_counter()
+        if now - last.get(record['stage'], 0.0) >= PROGRESS_INTERVAL:
+            last[record['stage']] = now
+            _events.put((job_id, dict(event='progress', **_plain(record))))
+
+    profiler = stageProfiler(callbacks=[stage_done], progress=[progress])
+    cache = None
+    if cache_dir is not None:
+        from crazyKhoreia.contourCache import contourCache
+        cache = contourCache(cache_dir)
+
+    # The pipeline's prints would interleave across jobs, the events replace them.
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'lightPainting':
+            from crazyKhoreia.lightPainting import lightPainting
+            lp = lightPainting(in_path=in_path, out_path=out_path, headless=True,
+                               cache=cache, profiler=profiler, **params)
+            summary = dict(waypoints=len(lp.wpts), distance=lp.distance, time=lp.Time)
+        elif mode == 'multiDroneFormation':
+            from crazyKhoreia.multiDroneFormation import multiDroneFormation
+            mdf = multiDroneFormation(in_path=in_path, out_path=out_path, headless=True,
+                                      cache=cache, profiler=profiler, **params)
+            summary = dict(converged=mdf.iou_stats['converged'], iterations=mdf.iou_stats['iterations'],
+                           conflicts=len(mdf.conflicts))
+        else:
+            raise ValueError("Unknown mode: " + str(mode))
+
+    summary['wall'] = profiler.report()['wall']
+
+    return _plain(summary)
+
+
+class planningService():
+    """
+    planningService is a long-running local planning daemon, it keeps a pool of worker processes with the
+    libraries already imported and the contour cache warm, and accepts jobs as JSON lines over a local TCP socket.
+    Every message gets one JSON line per event back: accepted, stage (a finished stage record), progress
+    (e.g. getIoUsppd iterations), and done (with the run summary) or error. On shutdown, new jobs are refused
+    while the accepted ones, running or queued, finish and report before every connection is closed.
+    Messages:
+        {"op": "run", "id": "job-1", "mode": "multiDroneFormation", "in_path": ..., "out_path": ..., "params": {...}}
+        {"op": "ping"}
+        {"op": "shutdown"}
+    Attributes:
+        host        (str):      Address to listen on, local only by default.
+        port        (int):      Port to listen on, 0 picks a free one.
+        workers     (int):      Number of worker processes, defaults to the number of CPUs.
+        cache_dir   (str):      Optional contourCache directory shared by every job.
+
+        jobs        (dict):     Running job id to its connection's writer and the future of its final event.
+        completed   (int):      Number of finished jobs.
+        tasks       (set):      Tasks of the accepted jobs, awaited on shutdown.
+        connections (dict):     Open connection's writer to its handler task, closed on shutdown.
+
+    Methods:
+        start():
+            Start the worker pool and the server, and return the listening port.
+        serve_forever():
+            Start the service, if needed, and serve until a shutdown message.
+        close():
+            Stop the server and the worker pool.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, workers=None, cache_dir=None):
+        self.host, self.port, self.workers, self.cache_dir = host, port, workers, cache_dir
+        self.jobs, self.completed = {}, 0
+        self.tasks, self.connections = set(), {}
+        self.server, self.executor = None, None
+        self.loop = asyncio.new_event_loop()
+
+    def start(self):
+        import multiprocessing
+
+        asyncio.set_event_loop(self.loop)
+        self.manager = multiprocessing.Manager()
+        self.events = self.manager.Queue()
+        workers = self.workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up,
+                                            initargs=(self.events,))
+
+        # Warm every worker up now rather than on the first jobs.
+        for job in [self.executor.submit(time.sleep, 0.1) for _ in range(workers)]:
+            job.result()
+
+        # Forward the worker events to the connection of their job.
+        self.relay = threading.Thread(target=self._relay, daemon=True)
+        self.relay.start()
+
+        self.stopped = asyncio.Event()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        print("Planning service listening on " + self.host + ":" + str(self.port) +
+              " with " + str(workers) + " workers.")
+
+        return self.port
+
+    def serve_forever(self):
+        if self.server is None:
+            self.start()
+        try:
+            self.loop.run_until_complete(self.stopped.wait())
+            self.loop.run_until_complete(self._drain())
+        finally:
+            self.close()
+
+    async def _drain(self):
+        # Stop listening, let the accepted jobs finish and report, then close the connections still open.
+        self.server.close()
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+        for writer in list(self.connections):
+            writer.close()
+        if self.connections:
+            await asyncio.wait(self.connections.values())
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.server = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.events.put(None)
+            self.relay.join()
+            self.manager.shutdown()
+            self.executor = None
+
+    def _relay(self):
+        while(1):
+            item = self.events.get()
+            if item is None:
+                break
+            job_id, event = item
+            self.loop.call_soon_threadsafe(self._send_event, job_id, event)
+
+    def _send_event(self, job_id, event):
+        if job_id in self.jobs:
+            writer, finished = self.jobs[job_id]
+            _send(writer, dict(id=job_id, **event))
+            if event['event'] in ('done', 'error') and not finished.done():
+                finished.set_result(event)
+
+    async def _handle(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        tasks = []
+        while(1):
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line.decode())
+                op = message.get('op', 'run')
+            except (ValueError, AttributeError) as e:
+                _send(writer, dict(event='error', error="Invalid message: " + str(e)))
+                continue
+
+            if op == 'ping':
+                _send(writer, dict(event='pong', jobs=len(self.jobs), completed=self.completed))
+            elif op == 'shutdown':
+                _send(writer, dict(event='shutdown'))
+                self.stopped.set()
+            elif op == 'run' and self.stopped.is_set():
+                _send(writer, dict(id=message.get('id'), event='error', error="Service shutting down."))
+            elif op == 'run':
+                tasks.append(self.loop.create_task(self._run(message, writer)))
+                self.tasks.add(tasks[-1])
+                tasks[-1].add_done_callback(self.tasks.discard)
+            else:
+                _send(writer, dict(id=message.get('id'), event='error',
+                                   error="Unknown op: " + str(op)))
+
+        # Let the connection's jobs finish before closing it.
+        if tasks:
+            await asyncio.wait(tasks)
+        writer.close()
+        del self.connections[writer]
+
+    async def _run(self, message, writer):
+        job_id = str(message.get('id', 'job-' + str(self.completed + len(self.jobs))))
+        if job_id in self.jobs:
+            _send(writer, dict(id=job_id, event='error', error="Job id already running."))
+            return
+
+        finished = self.loop.create_future()
+        self.jobs[job_id] = (writer, finished)
+        _send(writer, dict(id=job_id, event='accepted'))
+        try:
+            out_path = os.path.join(message.get('out_path', '.'), '')
+            await self.loop.run_in_executor(
+                self.executor, run_job, job_id, message['mode'], message['in_path'], out_path,
+                message.get('params', {}), self.cache_dir)
+            # The final event comes through the event queue, after the job's progress events.
+            await finished
+        except Exception as e:
+            # Invalid messages or a broken worker pool, the job never reported.
+            self._send_event(job_id, dict(event='error', error=type(e).__name__ + ": " + str(e)))
+        self.completed += 1
+        del self.jobs[job_id]
+
+
+def _send(writer, event):
+    if not writer.transport.is_closing():
+        writer.write((json.dumps(event, default=str) + '\n').encode())
+
+
+def _plain(obj):
+    # JSON friendly copy of a record, numpy values become Python ones.
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(v) for v in obj]
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return obj
+
+
+def request(message, host='127.0.0.1', port=8765, timeout=None):
+    """ Send one message to a running service and yield its events until the job is done or failed.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(message) + '\n').encode())
+        with sock.makefile('r') as f:
+            for line in f:
+                event = json.loads(line)
+                yield event
+                if event['event'] in ('done', 'error', 'pong', 'shutdown'):
+                    break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the crazyKhoreia planning service, jobs are JSON lines over a local TCP socket.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Number of worker processes, defaults to the number of CPUs.")
+    parser.add_argument('--cache', default=None,
+                        help="Contour cache directory, shared by every job.")
+    args = parser.parse_args(argv)
+
+    planningService(args.host, args.port, args.workers, args.cache).serve_forever()
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# Fixed-size segment record: duration, 8 power basis coefficients (in seconds from the segment start)
+# for x, y, z and yaw (the poly4d layout), plus the segment's LED state and padding. The duration is a
+# double, since the segment start times are its running sum and float32 rounding would accumulate.
+DEGREE = 7
+SEGMENT = struct.Struct('<d' + str(4*(DEGREE + 1)) + 'fB3x')
+
+# Sample rate used to measure the fitting error.
+FIT_RATE = 100.0
+
+
+def _fit(tau, y):
+    """ Least squares polynomial of DEGREE in tau in [0, 1] that passes exactly through both endpoints.
+    Output:
+        coeffs: (DEGREE + 1, 3) power basis coefficients in tau.
+    """
+    # p(tau) = y0 + tau*(y1 - y0) + tau*(1 - tau)*q(tau), only q is fitted.
+    y0, y1 = y[0], y[-1]
+    line = y0 + tau[:, None]*(y1 - y0)
+    basis = (tau*(1 - tau))[:, None]*tau[:, None]**np.arange(DEGREE - 1)
+    q = np.linalg.lstsq(basis, y - line, rcond=None)[0] if len(tau) > 2 else \
+        np.zeros(shape=(DEGREE - 1, y.shape[1]))
+
+    # Expand tau*(1 - tau)*tau^k = tau^(k+1) - tau^(k+2) into the power basis.
+    coeffs = np.zeros(shape=(DEGREE + 1, y.shape[1]))
+    coeffs[0] = y0
+    coeffs[1] = y1 - y0
+    coeffs[1:DEGREE] += q
+    coeffs[2:DEGREE + 1] -= q
+
+    return coeffs
+
+
+def _evaluate(coeffs, tau):
+    # Horner scheme, coeffs (DEGREE + 1, ...) in increasing powers.
+    value = np.zeros(shape=(len(tau),) + coeffs.shape[1:])
+    for c in coeffs[::-1]:
+        value = value*tau[:, None] + c
+    return value
+
+
+def _to_seconds(coeffs, duration):
+    # Rescale the coefficients from tau = t/duration to t, and round them as stored.
+    scale = np.maximum(duration, 1e-9)**-np.arange(DEGREE + 1)
+    return (coeffs*scale[:, None]).astype(np.float32)
+
+
+def compress(traj, tolerance=0.01, rate=FIT_RATE):
+    """ Fit a timed trajectory with piecewise polynomials within a position error tolerance.
+    Segments are grown greedily (exponential then binary search on their end sample) and never span
+    an LED change. The error is the Euclidean distance, measured on the float32 coefficients as stored.
+    Input:
+        traj: trajectory instance, see crazyKhoreia.trajectory.
+        tolerance: maximum position error in meters.
+        rate: sample rate in Hz used to fit and measure the error.
+    Output:
+        segments: list of (duration, coeffs (DEGREE + 1, 3) float32 in seconds, led) tuples.
+    """
+    # Fixed-rate samples plus the exact waypoint times, so corners and LED changes are sampled.
+    t = np.union1d(np.linspace(0.0, traj.duration, int(np.ceil(traj.duration*rate)) + 1), traj.t)
+    pos, _, led = traj.sample(t)
+    led = np.ones(shape=(len(t),), dtype=np.uint8) if led is None else led.astype(np.uint8)
+
+    # Pieces of constant LED state share their boundary sample, so the path stays continuous.
+    breaks = np.flatnonzero(np.diff(led) != 0) + 1
+    pieces = zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(t) - 1]]))
+
+    def fits(a, b):
+        duration = t[b] - t[a]
+        tau = (t[a:b + 1] - t[a])/max(duration, 1e-12)
+        coeffs = _fit(tau, pos[a:b + 1])
+        stored = _to_seconds(coeffs, duration)
+        err = np.max(np.linalg.norm(_evaluate(stored.astype(float), t[a:b + 1] - t[a]) - pos[a:b + 1], axis=1))
+        return err <= tolerance, stored
+
+    segments = []
+    for a, last in pieces:
+        while(a < last):
+            # Exponential search for a failing end, then binary search for the last fitting one,
+            # keeping the coefficients of the last fit that passed.
+            step, good = 1, a + 1
+            stored = fits(a, good)[1]
+            while(good + step <= last):
+                ok, candidate = fits(a, good + step)
+                if not ok:
+                    break
+                good, stored = good + step, candidate
+                step *= 2
+            lo, hi = good, min(good + step, last + 1)
+            while(hi - lo > 1):
+                mid = (lo + hi)//2
+                ok, candidate = fits(a, mid)
+                if ok:
+                    lo, stored = mid, candidate
+                else:
+                    hi = mid
+            segments.append((t[lo] - t[a], stored, int(led[a])))
+            a = lo
+
+    return segments
+
+
+def pack(segments):
+    """ Pack segments into their fixed-size binary records (SEGMENT.size bytes each), yaw is left at zero.
+    """
+    records = []
+    for duration, coeffs, led in segments:
+        values = np.zeros(shape=(4, DEGREE + 1), dtype=np.float32)
+        values[:3] = coeffs.T
+        records.append(SEGMENT.pack(duration, *values.ravel(), led))
+
+    return b''.join(records)
+
+
+def unpack(data):
+    """ Read the records written by pack() back into (duration, coeffs, led) segments.
+    """
+    segments = []
+    for values in SEGMENT.iter_unpack(data):
+        coeffs = np.array(values[1:-1], dtype=np.float32).reshape(4, DEGREE + 1)[:3].T
+        segments.append((values[0], coeffs, values[-1]))
+
+    return segments
+
+
+def evaluate(segments, t):
+    """ Position and LED state of the piecewise polynomial at the times t.
+    """
+    durations = np.array([s[0] for s in segments], dtype=float)
+    starts = np.concatenate([[0.0], np.cumsum(durations)])
+    t = np.clip(np.asarray(t, dtype=float), 0.0, starts[-1])
+    i = np.clip(np.searchsorted(starts, t, side='right') - 1, 0, len(segments) - 1)
+
+    pos = np.empty(shape=(len(t), 3))
+    for k in np.unique(i):
+        sel = i == k
+        pos[sel] = _evaluate(segments[k][1].astype(float), t[sel] - starts[k])
+    led = np.array([s[2] for s in segments])[i]
+
+    return pos, led
+
+
+class mockLink():
+    """
+    mockLink is an in-process stand-in for the radio uploader, it splits a payload into packets, simulates
+    losses and corrupted packets with retransmissions and accounts for the airtime, without any hardware.
+    Each packet carries the CRC32 of its data, a received packet that doesn't match it is sent again.
+    Attributes:
+        payload         (int):      Data bytes per packet.
+        packet_rate     (float):    Packets per second the radio can send.
+        loss            (float):    Probability of losing a packet (it's sent again).
+        corrupt         (float):    Probability of flipping a bit of a received packet (its CRC fails and it's sent again).
+        seed            (int):      Random seed of the losses.
+
+        memory          (dict):     Uploaded payload of each UAV, as received.
+        log             (list):     Stats of every upload.
+
+    Methods:
+        upload(uav, data):
+            Send data to a UAV's memory and return the upload stats.
+        upload_swarm(payloads):
+            Upload one payload per UAV, one after the other on the shared link, and return the total stats.
+    """
+
+    def __init__(self, payload=30, packet_rate=1000.0, loss=0.0, corrupt=0.0, seed=0):
+        self.payload, self.packet_rate, self.loss, self.corrupt = payload, packet_rate, loss, corrupt
+        self.rng = np.random.default_rng(seed)
+        self.memory, self.log = {}, []
+
+    def upload(self, uav, data):
+        start = time.perf_counter()
+        chunks = [data[i:i + self.payload]
+                  for i in range(0, len(data), self.payload)]
+
+        # Each lost or corrupted packet is retransmitted until it gets through intact.
+        sent, corrupted = 0, 0
+        received = bytearray()
+        for chunk in chunks:
+            crc = zlib.crc32(chunk)
+            while(1):
+                sent += 1
+                if self.rng.random() < self.loss:
+                    continue
+                packet = bytearray(chunk)
+                if self.rng.random() < self.corrupt:
+                    packet[self.rng.integers(len(packet))] ^= 1 << int(self.rng.integers(8))
+                if zlib.crc32(packet) == crc:
+                    break
+                corrupted += 1
+            received += packet
+        self.memory[uav] = bytes(received)
+
+        stats = dict(uav=uav, bytes=len(data), packets=len(chunks), retries=sent - len(chunks),
+                     corrupted=corrupted, airtime=sent/self.packet_rate, wall=time.perf_counter() - start)
+        self.log.append(stats)
+
+        return stats
+
+    def upload_swarm(self, payloads):
+        stats = [self.upload(uav, data) for uav, data in enumerate(payloads)]
+
+        return dict(uavs=len(stats), bytes=sum(s['bytes'] for s in stats), packets=sum(s['packets'] for s in stats),
+                    retries=sum(s['retries'] for s in stats), corrupted=sum(s['corrupted'] for s in stats),
+                    airtime=sum(s['airtime'] for s in stats),
+                    wall=sum(s['wall'] for s in stats))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+
+class stageProfiler():
+    """
+    stageProfiler records the wall time, CPU time and, if set, peak memory of every pipeline stage.
+    Attributes:
+        memory      (bool):     Set to trace the peak memory of each stage with tracemalloc, slows down Python heavy stages.
+        callbacks   (list):     Functions called with each stage record as soon as the stage ends, e.g. to feed a metrics system.
+        progress    (list):     Functions called with the progress updates of long stages, such as getIoUsppd iterations.
+
+        records     (list):     One dict per finished stage: stage, start, wall, cpu, peak_bytes (if memory) and
+                                the stage's own values, such as array sizes or iteration counts.
+
+    Methods:
+        stage(name, **values):
+            Context manager timing the enclosed code, it returns the stage record so values can be added to it.
+        update(name, **values):
+            Report the progress of a running stage to the progress functions.
+        report():
+            Return the run report as a dict.
+        save(path):
+            Write the run report to a JSON file.
+    """
+
+    enabled = True
+
+    def __init__(self, memory=False, callbacks=None, progress=None):
+        self.memory, self.callbacks, self.progress = memory, list(
+            callbacks or []), list(progress or [])
+        self.records, self.stack = [], []
+        self.t0 = time.perf_counter()
+
+        if self.memory == True and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, **values):
+        return _stage(self, name, values)
+
+    def update(self, name, **values):
+        for callback in self.progress:
+            callback(dict(stage=name, **values))
+
+    def report(self):
+        report = dict(python=platform.python_version(), platform=platform.platform(),
+                      argv=sys.argv, wall=time.perf_counter() - self.t0, stages=self.records)
+        try:
+            import resource
+            report['max_rss_bytes'] = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss*1024
+        except ImportError:
+            pass
+
+        return report
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1, default=_to_json)
+
+
+class _stage():
+    # Records one stage, nested stages propagate their peak memory to the enclosing ones.
+    def __init__(self, profiler, name, values):
+        self.profiler = profiler
+        self.record = dict(stage=name, **values)
+
+    def __enter__(self):
+        p = self.profiler
+        if p.stack:
+            self.record['parent'] = p.stack[-1].record['stage']
+        p.stack.append(self)
+
+        if p.memory == True:
+            current, peak = tracemalloc.get_traced_memory()
+            # Fold the enclosing stage's peak so far into it before the reset.
+            if len(p.stack) > 1:
+                p.stack[-2].peak = max(p.stack[-2].peak, peak)
+            self.base = current
+            self.peak = self.base
+            _reset_peak()
+        self.start, self.cpu = time.perf_counter(), time.process_time()
+
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        wall, cpu = time.perf_counter() - self.start, time.process_time() - self.cpu
+        p = self.profiler
+        p.stack.pop()
+
+        self.record.update(start=self.start - p.t0, wall=wall, cpu=cpu)
+        if exc_type is not None:
+            self.record['error'] = exc_type.__name__
+        if p.memory == True:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            self.record['peak_bytes'] = peak - self.base
+            if p.stack:
+                p.stack[-1].peak = max(p.stack[-1].peak, peak)
+            _reset_peak()
+
+        p.records.append(self.record)
+        for callback in p.callbacks:
+            callback(self.record)
+
+        return False
+
+
+class nullProfiler():
+    """
+    Disabled profiler, every stage is a no-op, used when no profiler is given.
+    """
+
+    enabled = False
+
+    def __init__(self):
+        self.sink = {}
+
+    def stage(self, name, **values):
+        return self
+
+    def update(self, name, **values):
+        pass
+
+    def __enter__(self):
+        return self.sink
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_PROFILER = nullProfiler()
+
+
+def _reset_peak():
+    # tracemalloc.reset_peak() is only available on Python 3.9+.
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+def _to_json(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# Fixed-rate samples generated and written per chunk, bounds the memory of long streams.
+CHUNK_SAMPLES = 1 << 16
+
+# Default setpoint rate in Hz over which a corner's change of direction is spread.
+CORNER_RATE = 100.0
+
+# Setpoint time format, the exact final time is only added if it doesn't print as the last tick's time.
+TIME_FMT = '%.4f'
+
+
+def _ends_between_ticks(duration, num_samples, rate):
+    return TIME_FMT % duration != TIME_FMT % ((num_samples - 1)/rate)
+
+
+class trajectory():
+    """
+    trajectory time-parameterizes a polyline with a trapezoidal velocity profile under maximum velocity and acceleration.
+    A corner changes the direction of the velocity at once, so its speed is bounded to keep that velocity change
+    within accel over one setpoint period: the stream's finite-difference acceleration stays within accel along
+    the path, plus at most accel at a corner.
+    Attributes:
+        points      (array):    n x 3 float array of waypoints, consecutive duplicates are dropped.
+        speed       (float):    Maximum velocity in m/s.
+        accel       (float):    Maximum acceleration in m/s^2.
+        led         (array):    Optional per waypoint LED state, the segment towards waypoint i takes led[i].
+        rate        (float):    Setpoint rate in Hz the corners are bounded for, CORNER_RATE if not set.
+
+        s           (array):    Arc length at each waypoint.
+        v           (array):    Speed at each waypoint, zero at both ends and reduced at corners.
+        t           (array):    Time at which each waypoint is reached.
+        duration    (float):    Total duration in seconds.
+
+    Methods:
+        sample(t):
+            Return the position, velocity and LED state at the times t, vectorized.
+        write(f, rate):
+            Write the setpoint stream sampled at rate Hz to an open text file, chunk by chunk.
+    """
+
+    def __init__(self, points, speed=1.0, accel=1.0, led=None, rate=None):
+        points = np.asarray(points, dtype=float)
+        keep = np.ones(shape=(len(points),), dtype=bool)
+        keep[1:] = np.any(np.diff(points, axis=0) != 0, axis=1)
+        self.points, self.speed, self.accel = points[keep], speed, accel
+        self.rate = CORNER_RATE if rate is None else rate
+        self.led = None if led is None else np.asarray(led)[keep]
+
+        seg = np.diff(self.points, axis=0)
+        self.d = np.linalg.norm(seg, axis=1)
+        self.u = seg/np.where(self.d > 0, self.d, 1)[:, None]
+        self.s = np.concatenate([[0.0], np.cumsum(self.d)])
+
+        # Speed limit at each waypoint: stop at both ends, and on corners keep the velocity change
+        # speed*|u_in - u_out| within accel/rate.
+        limit = np.full(shape=(len(self.points),), fill_value=speed**2)
+        limit[0] = limit[-1] = 0.0
+        if len(self.d) > 1:
+            turn = np.linalg.norm(self.u[1:] - self.u[:-1], axis=1)
+            with np.errstate(divide='ignore'):
+                limit[1:-1] = np.minimum(speed, accel/self.rate/turn)**2
+
+        # Forward and backward passes on the squared speed, w[i] = min(limit[i], w[i - 1] + 2*a*d), are
+        # min-plus prefix scans: w[i] = 2*a*s[i] + min over k <= i of (limit[k] - 2*a*s[k]).
+        a2s = 2*accel*self.s
+        forward = np.minimum.accumulate(limit - a2s) + a2s
+        backward = np.minimum.accumulate((limit + a2s)[::-1])[::-1] - a2s
+        w = np.maximum(np.minimum(forward, backward), 0.0)
+        self.v = np.sqrt(w)
+
+        # Per segment trapezoid: accelerate to the peak speed, cruise, and decelerate.
+        w0, w1 = w[:-1], w[1:]
+        self.vp = np.sqrt(np.clip((w0 + w1 + 2*accel*self.d)/2,
+                          np.maximum(w0, w1), speed**2))
+        self.ta = (self.vp - self.v[:-1])/accel
+        self.da = (self.vp**2 - w0)/(2*accel)
+        self.td = (self.vp - self.v[1:])/accel
+        self.dc = np.maximum(self.d - self.da - (self.vp**2 - w1)/(2*accel), 0.0)
+        self.tc = self.dc/np.where(self.vp > 0, self.vp, 1)
+
+        self.t = np.concatenate([[0.0], np.cumsum(self.ta + self.tc + self.td)])
+        self.duration = self.t[-1]
+
+    def sample(self, t):
+        t = np.clip(np.asarray(t, dtype=float), 0.0, self.duration)
+        if len(self.d) == 0:
+            pos = np.repeat(self.points[:1], len(t), axis=0)
+            led = None if self.led is None else np.repeat(self.led[:1], len(t))
+            return pos, np.zeros(shape=pos.shape), led
+
+        i = np.clip(np.searchsorted(self.t, t, side='right') - 1, 0, len(self.d) - 1)
+        tau = t - self.t[i]
+        ta, tc, v0, vp, a = self.ta[i], self.tc[i], self.v[:-1][i], self.vp[i], self.accel
+
+        # Distance and speed along the segment on each phase of its trapezoid.
+        td = np.maximum(tau - ta - tc, 0.0)
+        accelerating, cruising = tau < ta, tau < ta + tc
+        s = np.where(accelerating, v0*tau + a*tau**2/2,
+                     np.where(cruising, self.da[i] + vp*(tau - ta),
+                              self.da[i] + self.dc[i] + vp*td - a*td**2/2))
+        v = np.where(accelerating, v0 + a*tau,
+                     np.where(cruising, vp, vp - a*td))
+        s = np.clip(s, 0.0, self.d[i])
+        v = np.maximum(v, 0.0)
+
+        pos = self.points[i] + s[:, None]*self.u[i]
+        vel = v[:, None]*self.u[i]
+        led = None if self.led is None else self.led[i + 1]
+
+        return pos, vel, led
+
+    def write(self, f, rate):
+        # The stream ends with one setpoint at the exact final time.
+        num_samples = int(np.floor(self.duration*rate)) + 1
+        fmt = [TIME_FMT] + ['%.6f']*6 + ([] if self.led is None else ['%d'])
+
+        for start in range(0, num_samples, CHUNK_SAMPLES):
+            t = np.arange(start, min(start + CHUNK_SAMPLES, num_samples))/rate
+            if start + CHUNK_SAMPLES >= num_samples and _ends_between_ticks(self.duration, num_samples, rate):
+                t = np.append(t, self.duration)
+            pos, vel, led = self.sample(t)
+            rows = [t[:, None], pos, vel] + ([] if led is None else [led[:, None]])
+            np.savetxt(f, np.hstack(rows), delimiter=",", fmt=fmt)
+
+
+class swarmClock():
+    """
+    swarmClock drives the normalized time of a swarm transition, where every UAV flies its straight line at
+    constant speed in that time after its start delay, as checked by closest_approach(). The clock comes to
+    rest at every start and stop of a UAV and runs a trapezoidal profile, scaled to the longest path,
+    between them, so every UAV starts and stops at rest within the velocity and acceleration limits.
+    Attributes:
+        length      (float):    Longest path length, one unit of normalized time moves it by length.
+        knots       (array):    Normalized times at which the clock is at rest: 0, every delay and delay + 1.
+        pieces      (list):     trajectory of the clock between consecutive knots.
+        t           (array):    Time at which each knot is reached.
+        duration    (float):    Transition duration in seconds, delays included.
+
+    Methods:
+        sample(t):
+            Return the normalized time and its rate at the times t, vectorized.
+    """
+
+    def __init__(self, start, end, speed=1.0, accel=1.0, delays=None):
+        start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+        delays = np.zeros(shape=(len(start),)) if delays is None else np.asarray(
+            delays, dtype=float)
+
+        self.length = max(np.max(np.linalg.norm(end - start, axis=1), initial=0), 1e-12)
+        self.knots = np.unique(np.concatenate([[0.0], delays, delays + 1]))
+        self.pieces = [trajectory([[0, 0, 0], [(b - a)*self.length, 0, 0]], speed, accel)
+                       for a, b in zip(self.knots[:-1], self.knots[1:])]
+        self.t = np.concatenate([[0.0], np.cumsum([p.duration for p in self.pieces])])
+        self.duration = self.t[-1]
+
+    def sample(self, t):
+        t = np.clip(np.asarray(t, dtype=float), 0.0, self.duration)
+        i = np.clip(np.searchsorted(self.t, t, side='right') - 1, 0, len(self.pieces) - 1)
+
+        tau, dtau = np.empty(shape=(len(t),)), np.empty(shape=(len(t),))
+        for k in np.unique(i):
+            sel = i == k
+            s, v, _ = self.pieces[k].sample(t[sel] - self.t[k])
+            tau[sel] = self.knots[k] + s[:, 0]/self.length
+            dtau[sel] = v[:, 0]/self.length
+
+        return tau, dtau
+
+
+def swarm_setpoints(f, start, end, rate, speed=1.0, accel=1.0, delays=None):
+    """ Write the setpoint stream of a swarm transition, driven by a swarmClock: the UAVs go through exactly
+    the configurations checked by closest_approach() with the same delays, and start and stop at rest.
+    Rows are time, UAV index, position and velocity, ordered by time.
+    Input:
+        f: open text file.
+        start, end: (N,3) arrays of initial and final positions.
+        rate: setpoint rate in Hz.
+        speed, accel: maximum velocity and acceleration of every UAV.
+        delays: optional (N,) start delays as fractions of the transition duration, see stagger_delays().
+    Output:
+        duration: transition duration in seconds, delays included.
+    """
+    start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+    num_drones = len(start)
+    delays = np.zeros(shape=(num_drones,)) if delays is None else np.asarray(
+        delays, dtype=float)
+    clock = swarmClock(start, end, speed, accel, delays)
+    total = clock.duration
+
+    num_samples = int(np.floor(total*rate)) + 1
+    ticks = max(1, CHUNK_SAMPLES//num_drones)
+    uav = np.arange(num_drones)
+    fmt = [TIME_FMT, '%d'] + ['%.6f']*6
+
+    for first in range(0, num_samples, ticks):
+        t = np.arange(first, min(first + ticks, num_samples))/rate
+        if first + ticks >= num_samples and _ends_between_ticks(total, num_samples, rate):
+            t = np.append(t, total)
+        tau, dtau = clock.sample(t)
+
+        # Constant velocity progress of each UAV in the clock's time, after its delay.
+        local = tau[:, None] - delays[None, :]
+        progress = np.clip(local, 0, 1).ravel()
+        moving = ((local > 0) & (local < 1)).ravel()
+
+        delta = np.tile(end - start, (len(t), 1))
+        pos = np.tile(start, (len(t), 1)) + progress[:, None]*delta
+        vel = (moving*np.repeat(dtau, num_drones))[:, None]*delta
+        rows = np.column_stack([np.repeat(t, num_drones), np.tile(uav, len(t)), pos, vel])
+        np.savetxt(f, rows, delimiter=",", fmt=fmt)
+
+    return total
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Run the tests against the source tree, as benchmarks/run_benchmarks.py does.
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from crazyKhoreia._batchIoU import iou_matrix
+from crazyKhoreia._IoUTable import _IoUTable
+
+BOX_SHAPE = np.array([0.3, 0.2, 0.4])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_moves_match_a_full_recomputation(seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-0.6, 0.6, size=(25, 3))
+    table = _IoUTable(centers, BOX_SHAPE)
+
+    for _ in range(200):
+        # Small steps, cell changes and long jumps, including exact box size steps.
+        i = rng.integers(len(centers))
+        kind = rng.integers(3)
+        if kind == 0:
+            delta = rng.normal(scale=0.05, size=3)
+        elif kind == 1:
+            delta = BOX_SHAPE*rng.integers(-1, 2, size=3)
+        else:
+            delta = rng.uniform(-0.6, 0.6, size=3)
+        table.move(i, delta)
+        centers[i] += delta
+
+        matrix = iou_matrix(centers, BOX_SHAPE)
+        assert np.allclose(table.centers, centers)
+        assert np.allclose(table.UAV_IoU, matrix.sum(axis=1), atol=1e-12)
+        for j in range(len(centers)):
+            assert set(table.pairs[j]) == set(np.flatnonzero(matrix[j] > 0))
+            assert np.allclose([table.pairs[j][k] for k in table.pairs[j]],
+                               matrix[j, list(table.pairs[j])], atol=1e-12)
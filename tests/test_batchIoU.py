@@ -0,0 +1,97 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from crazyKhoreia._3DIoU import _3DIoU
+from crazyKhoreia._batchIoU import candidate_pairs, iou_matrix, pair_iou, pair_overlap
+
+ATOL = 1e-5
+SHAPES = np.array([[0.3, 0.3, 0.3], [0.3, 0.2, 0.4], [0.1, 0.1, 0.1]])
+
+
+def random_boxes(seed, num_boxes=12, shapes=SHAPES):
+    # Centers on a coarse lattice, so touching boxes (exactly one box apart), contained boxes and
+    # identical centers all show up.
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(-4, 5, size=(num_boxes, 3))*0.05
+    centers[1] = centers[0]
+    shapes = shapes[rng.integers(0, len(shapes), size=num_boxes)]
+
+    return centers, shapes
+
+
+def reference(centers, shapes, heading_angle=0.0, jitter=1e-7):
+    # _3DIoU clips polygons with a strict inside test, which fails on coincident faces (e.g. identical
+    # boxes). The centers are jittered so no face coincides, the IoU changes by less than ATOL.
+    rng = np.random.default_rng(0)
+    centers = centers + rng.uniform(-jitter, jitter, size=centers.shape)
+    matrix = np.zeros(shape=(len(centers), len(centers)))
+    for i, j in itertools.combinations(range(len(centers)), 2):
+        matrix[i][j] = matrix[j][i] = _3DIoU([shapes[i], heading_angle, centers[i]],
+                                             [shapes[j], heading_angle, centers[j]]).IOU_3d
+
+    return matrix
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_iou_matrix_matches_the_reference(seed):
+    centers, shapes = random_boxes(seed)
+    expected = reference(centers, shapes)
+
+    assert np.allclose(iou_matrix(centers, shapes), expected, atol=ATOL)
+    i, j = np.triu_indices(len(centers), 1)
+    assert np.allclose(pair_iou(centers[i], centers[j], shapes[i], shapes[j]), expected[i, j], atol=ATOL)
+
+    # The overlap volume, from the IoU and both volumes.
+    vols = np.prod(shapes, axis=1)
+    volume = expected*(vols[:, None] + vols[None, :])/(1 + expected)
+    np.fill_diagonal(volume, 0.0)
+    assert np.allclose(iou_matrix(centers, shapes, volume=True), volume, atol=ATOL*np.max(vols))
+
+
+def test_iou_matrix_special_cases():
+    box = np.array([0.3, 0.2, 0.4])
+    centers = np.array([[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.3, 0.0, 0.0], [0.3, 0.2, 0.4], [0.02, 0.01, 0.0]])
+    shapes = np.array([box, box, box, box, box/4])
+    matrix = iou_matrix(centers, shapes)
+
+    # Identical boxes, touching boxes (face and corner) and a box contained in another.
+    assert matrix[0, 1] == pytest.approx(1.0)
+    assert matrix[0, 2] == 0.0 and matrix[0, 3] == 0.0
+    assert matrix[0, 4] == pytest.approx(1/64)
+    assert np.allclose(matrix, reference(centers, shapes), atol=ATOL)
+
+
+def test_iou_matrix_with_a_heading():
+    centers, shapes = random_boxes(0, num_boxes=6, shapes=SHAPES[:1])
+
+    assert np.allclose(iou_matrix(centers, shapes[0], heading_angle=0.4),
+                       reference(centers, shapes, heading_angle=0.4, jitter=0.0))
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('shared', [True, False])
+def test_candidate_pairs_keeps_every_overlap(seed, shared):
+    # Non-cubic boxes, shared or one size per box, on a lattice that puts many centers exactly one box apart.
+    centers, shapes = random_boxes(seed, num_boxes=40)
+    boxShape = SHAPES[1] if shared else shapes
+    sizes = np.broadcast_to(boxShape, centers.shape)
+
+    candidates = {tuple(p) for p in candidate_pairs(centers, boxShape)}
+    assert all(i < j for i, j in candidates)
+    for i, j in itertools.combinations(range(len(centers)), 2):
+        if pair_overlap(centers[i], centers[j], sizes[i], sizes[j]) > 0:
+            assert (i, j) in candidates
+
+
+def test_candidate_pairs_touching_boxes():
+    box = np.array([0.3, 0.2, 0.4])
+    centers = np.array([[0.0, 0.0, 0.0], [0.3, 0.0, 0.0], [0.299, 0.199, 0.399], [0.0, 0.2, 0.0]])
+    pairs = {tuple(p) for p in candidate_pairs(centers, box)}
+
+    # Boxes one box apart along any axis touch without overlapping, the rest overlap.
+    assert (0, 2) in pairs and (1, 2) in pairs and (2, 3) in pairs
+    assert all(pair_overlap(centers[i], centers[j], box, box) == 0
+               for i, j in [(0, 1), (0, 3), (1, 3)])
+    assert candidate_pairs(centers[:1], box).shape == (0, 2)
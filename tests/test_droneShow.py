@@ -0,0 +1,81 @@
+import itertools
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from crazyKhoreia._barePipeline import bare
+from crazyKhoreia.droneShow import droneShow
+
+DIMS = np.array([[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]])
+
+
+def brute_force(cost):
+    # Every assignment of a small transition, as (maximum, total) travel.
+    n = len(cost)
+    return [(max(cost[i][s[i]] for i in range(n)), sum(cost[i][s[i]] for i in range(n)))
+            for s in itertools.permutations(range(n))]
+
+
+def transition(seed, n):
+    rng = np.random.default_rng(seed)
+    # Rounded coordinates, so ties in the distances show up.
+    return np.round(rng.uniform(-1, 1, size=(n, 3)), 1), np.round(rng.uniform(-1, 1, size=(n, 3)), 1)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('n', [1, 3, 6])
+def test_max_objective_matches_brute_force(seed, n):
+    start, goal = transition(seed, n)
+    cost = np.linalg.norm(start[:, None] - goal[None], axis=2)
+    options = brute_force(cost)
+    bottleneck = min(m for m, _ in options)
+    least = min(t for m, t in options if m <= bottleneck + 1e-12)
+
+    # The bottleneck distance is optimal and the slots are the least total travel among its assignments,
+    # whatever the warm start bound.
+    show = bare(droneShow, dims=DIMS, num_drones=n, objective='max')
+    for bound in (None, 0.0, bottleneck, 10.0, cost[0][0]):
+        slots, threshold = show.assign_transition(start, goal, bound)
+        travel = cost[np.arange(n), slots]
+        assert sorted(slots) == list(range(n))
+        assert threshold == pytest.approx(bottleneck)
+        assert np.max(travel) == pytest.approx(bottleneck)
+        assert np.sum(travel) == pytest.approx(least)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sum_objective_matches_brute_force(seed):
+    start, goal = transition(seed, 6)
+    cost = np.linalg.norm(start[:, None] - goal[None], axis=2)
+
+    show = bare(droneShow, dims=DIMS, num_drones=6, objective='sum')
+    slots, bound = show.assign_transition(start, goal)
+    assert sorted(slots) == list(range(6))
+    assert np.sum(cost[np.arange(6), slots]) == pytest.approx(min(t for _, t in brute_force(cost)))
+    assert bound == pytest.approx(np.max(cost[np.arange(6), slots]))
+
+
+def test_unknown_objective():
+    start, goal = transition(0, 3)
+    with pytest.raises(ValueError):
+        bare(droneShow, dims=DIMS, num_drones=3, objective='mean').assign_transition(start, goal)
+
+
+def test_show_only_saves_its_sequences(tmp_path):
+    paths = []
+    for k, radius in enumerate((60, 100)):
+        img = np.full(shape=(300, 300, 3), fill_value=255, dtype=np.uint8)
+        cv.circle(img, (150, 150), radius, (0, 0, 0), 4)
+        paths.append(str(tmp_path/('frame' + str(k) + '.png')))
+        cv.imwrite(paths[-1], img)
+    out_path = str(tmp_path/'out') + '/'
+    (tmp_path/'out').mkdir()
+
+    show = droneShow(DIMS, [0.3, 0.3, 0.3], paths, out_path, 6, objective='max', workers=1)
+
+    # One sequence per UAV, from the ground grid through every formation, and nothing from the formations.
+    assert show.sequence.shape == (6, 3, 3)
+    assert sorted(p.name for p in (tmp_path/'out').iterdir()) == sorted(
+        'show_uav' + str(i) + '_wpts.csv' for i in range(6))
+    assert np.allclose(np.loadtxt(out_path + 'show_uav0_wpts.csv', delimiter=','), show.sequence[0])
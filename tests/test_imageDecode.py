@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from crazyKhoreia._imageDecode import decode_plan, read_reduced
+
+DIMS = np.array([[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]])
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def poster(path, size, alpha=False):
+    # Black shapes on white, with a transparent background if alpha is set.
+    img = np.full(shape=(size, size, 4 if alpha else 3), fill_value=255, dtype=np.uint8)
+    if alpha:
+        img[:, :, 3] = 0
+    for k in range(1, 6):
+        cv.circle(img, (size//2, size//2), k*size//12, (0, 0, 0, 255), max(1, size//100))
+    cv.imwrite(str(path), img)
+
+    return str(path)
+
+
+@pytest.mark.parametrize('name, alpha, full_size', [('poster.jpg', False, False),
+                                                     ('poster.png', False, True),
+                                                     ('poster_alpha.png', True, True)])
+def test_decode_plan(tmp_path, capsys, name, alpha, full_size):
+    path = poster(tmp_path/name, 4000, alpha)
+    factor, flags, denom, full = decode_plan(path, DIMS, 0.05)
+
+    # Only opaque JPEG files are reduced while decoding, the rest warn about their full size decode.
+    assert factor == 16 and full == full_size
+    assert (flags == cv.IMREAD_UNCHANGED) == alpha
+    assert denom == (1 if alpha else 8)
+    img = read_reduced(path, DIMS, 0.05)
+    assert img.shape == (250, 250, 3)
+    assert ("decoded at full size" in capsys.readouterr().out) == full_size
+
+
+def test_small_images_are_not_reduced(tmp_path, capsys):
+    path = poster(tmp_path/'small.png', 200)
+
+    assert decode_plan(path, DIMS, 0.05)[0] == 1
+    assert read_reduced(path, DIMS, 0.05).shape == (200, 200, 3)
+    assert capsys.readouterr().out == ''
+
+
+PEAK = """
+import sys
+sys.path.insert(0, sys.argv[2])
+import numpy as np
+from crazyKhoreia._imageDecode import read_reduced
+
+def status(key):
+    with open('/proc/self/status') as f:
+        return [int(line.split()[1]) for line in f if line.startswith(key + ':')][0]
+
+# Reset the peak resident size, then measure the decode's peak above the current size.
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')
+before = status('VmRSS')
+read_reduced(sys.argv[1], np.array([[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]]), 0.05)
+print((status('VmHWM') - before)*1024)
+"""
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/clear_refs'), reason="needs Linux peak RSS reset")
+@pytest.mark.parametrize('name, bounded', [('poster.jpg', True), ('poster.png', False)])
+def test_decode_peak_memory(tmp_path, name, bounded):
+    size = 6000
+    path = poster(tmp_path/name, size)
+    try:
+        out = subprocess.run([sys.executable, '-c', PEAK, path, SRC], capture_output=True,
+                             text=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        pytest.skip("peak RSS unavailable: " + e.stderr.strip().splitlines()[-1])
+    peak = int(out.split()[-1])
+
+    # A JPEG never reaches a quarter of its full size, a PNG is decoded at full size, as documented.
+    full = size*size*3
+    if bounded:
+        assert peak < full/4
+    else:
+        assert peak > full/2
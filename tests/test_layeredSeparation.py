@@ -0,0 +1,84 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from crazyKhoreia._barePipeline import bare
+from crazyKhoreia._batchIoU import iou_matrix
+from crazyKhoreia._layeredSeparation import color_layers, overlap_edges
+from crazyKhoreia.multiDroneFormation import multiDroneFormation
+
+DIMS = np.array([[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]])
+BOX_SHAPE = np.array([0.3, 0.3, 0.3])
+
+
+def formation(seed, num_drones, spread=1.0):
+    # Cluster centroids on the Y-Z plane at the lowest depth, as get_idealPositions() places them.
+    rng = np.random.default_rng(seed)
+    cc = rng.uniform(-spread, spread, size=(num_drones, 2)) + [0.0, 1.5]
+
+    return np.array([DIMS[0][2]*np.ones(shape=(num_drones,)), cc[:, 0], cc[:, 1]]).T
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_overlap_edges_match_the_iou_matrix(seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(-6, 7, size=(40, 3))*0.05
+    u, v = overlap_edges(centers, BOX_SHAPE)
+
+    # Both directions of every overlapping pair, nothing else.
+    expected = {(i, j) for i, j in itertools.permutations(range(len(centers)), 2)
+                if iou_matrix(centers, BOX_SHAPE)[i][j] > 0}
+    assert sorted(zip(u.tolist(), v.tolist())) == sorted(expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_color_layers_is_proper(seed):
+    # Random graphs with a range of densities, every edge in both directions.
+    rng = np.random.default_rng(seed)
+    num_boxes = 60
+    pairs = np.array([p for p in itertools.combinations(range(num_boxes), 2)
+                      if rng.random() < 0.02 + 0.05*seed])
+    u, v = np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]])
+    layers, rounds = color_layers(num_boxes, u, v, seed=seed)
+
+    # No edge joins two boxes of the same layer, and as a greedy coloring no box exceeds its degree.
+    assert np.all(layers >= 0)
+    assert not np.any(layers[u] == layers[v])
+    assert np.all(layers <= np.bincount(u, minlength=num_boxes))
+    assert 1 <= rounds <= num_boxes
+
+
+def test_color_layers_without_edges():
+    empty = np.empty(shape=(0,), dtype=int)
+    layers, rounds = color_layers(5, empty, empty)
+
+    assert layers.tolist() == [0]*5 and rounds == 1
+
+
+@pytest.mark.parametrize('seed, num_drones, spread', [(0, 20, 1.0), (1, 40, 1.0), (2, 30, 0.7),
+                                                      (3, 60, 0.8), (4, 10, 0.2)])
+def test_converged_formations_are_overlap_free(seed, num_drones, spread):
+    mdf = bare(multiDroneFormation, dims=DIMS, boxShape=BOX_SHAPE, num_drones=num_drones,
+               solver='layered', idealPositions=formation(seed, num_drones, spread))
+    adjusted = mdf.getIoUsppd()
+
+    # Same scaled centers as the solver, the Z axis is halved for the downwash.
+    assert mdf.iou_stats['converged']
+    assert np.max(iou_matrix(adjusted/np.array([1, 1, 2]), BOX_SHAPE)) == 0
+
+    # UAVs only move forward along X by whole box lengths.
+    shift = (adjusted - mdf.idealPositions)/BOX_SHAPE[0]
+    assert np.allclose(shift[:, 1:], 0)
+    assert np.allclose(shift[:, 0], np.round(shift[:, 0])) and np.all(shift[:, 0] > -1e-9)
+    assert mdf.iou_stats['layers'] == int(np.round(np.max(shift[:, 0]))) + 1
+
+
+def test_unreachable_formations_report_failure():
+    # Every UAV on the same spot needs one layer each, far deeper than dims.
+    mdf = bare(multiDroneFormation, dims=DIMS, boxShape=BOX_SHAPE, num_drones=30, solver='layered',
+               idealPositions=formation(0, 30, 0.0))
+    adjusted = mdf.getIoUsppd()
+
+    assert not mdf.iou_stats['converged']
+    assert np.max(adjusted[:, 0]) <= DIMS[1][2] + BOX_SHAPE[0] + 1e-6
@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from crazyKhoreia.lightPainting import lightPainting
+from crazyKhoreia._barePipeline import bare
+
+DIMS = np.array([[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]])
+BOX_SHAPE = np.array([0.3, 0.3, 0.3])
+
+
+def painting(seed, num_waypoints):
+    # Random walk on the painting plane (x = MAX_X), above the ground.
+    rng = np.random.default_rng(seed)
+    yz = np.cumsum(rng.normal(scale=0.3, size=(num_waypoints, 2)), axis=0)
+    yz = np.clip(yz + [0.0, 1.5], [-1.5, 0.1], [1.5, 3.0])
+    wpts = np.column_stack([np.full(num_waypoints, DIMS[1][0]), yz])
+
+    return bare(lightPainting, dims=DIMS, in_path=None, out_path=None, boxShape=BOX_SHAPE, wpts=wpts)
+
+
+def bottleneck(lp, starts, ends):
+    # Longest piece: take off, path and landing.
+    S = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(lp.wpts, axis=0), axis=1))])
+    z = lp.wpts[:, 2]
+
+    return max(S[b] - S[a] + z[a] + z[b] for a, b in zip(starts, ends))
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('k', [1, 2, 3, 4])
+def test_partition_is_optimal(seed, k):
+    lp = painting(seed, 9)
+    last = len(lp.wpts) - 1
+    starts, ends = lp.partition(k)
+
+    # Contiguous pieces that share their split waypoints and cover the whole path.
+    assert 1 <= len(starts) <= k
+    assert starts[0] == 0 and ends[-1] == last
+    assert np.all(starts[1:] == ends[:-1]) and np.all(starts < ends)
+
+    # No split into at most k pieces has a shorter longest piece.
+    best = min(bottleneck(lp, (0,) + splits, splits + (last,))
+               for m in range(k) for splits in itertools.combinations(range(1, last), m))
+    assert bottleneck(lp, starts, ends) == pytest.approx(best, rel=1e-7)
+
+
+def flown(lp, a, b, step=0.02):
+    # Points flown by a piece on the painting plane: take off, path and landing, sampled every step.
+    corners = np.vstack([[lp.wpts[a, 1], 0.0], lp.wpts[a:b + 1, 1:3], [lp.wpts[b, 1], 0.0]])
+    samples = [corners[-1:]]
+    for p, q in zip(corners[:-1], corners[1:]):
+        n = max(1, int(np.ceil(np.linalg.norm(q - p)/step)))
+        samples.append(p + np.arange(n)[:, None]/n*(q - p))
+
+    return np.vstack(samples)
+
+
+def test_separate_never_shares_a_lane_between_conflicting_pieces():
+    num_conflicts = 0
+    for seed, k in itertools.product(range(5), [2, 4, 6]):
+        lp = painting(seed, 60)
+        starts, ends = lp.partition(k)
+        lanes, num_lanes = lp.separate(starts, ends)
+        assert num_lanes >= 1
+
+        pieces = [flown(lp, a, b) for a, b in zip(starts, ends)]
+        for p, q in itertools.combinations(range(len(pieces)), 2):
+            gap = np.abs(pieces[p][:, None] - pieces[q][None, :])
+            if np.any(np.all(gap < BOX_SHAPE[1:3], axis=2)):
+                num_conflicts += 1
+                assert lanes[p] != lanes[q]
+
+    assert num_conflicts > 0
@@ -0,0 +1,80 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from crazyKhoreia.parameterSweep import parameterSweep
+
+DIMS = [[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]]
+
+
+@pytest.fixture
+def drawing(tmp_path):
+    # Two black shapes on white.
+    img = np.full(shape=(300, 300, 3), fill_value=255, dtype=np.uint8)
+    cv.circle(img, (100, 150), 60, (0, 0, 0), 4)
+    cv.rectangle(img, (180, 80), (260, 220), (0, 0, 0), 4)
+    path = str(tmp_path/'drawing.png')
+    cv.imwrite(path, img)
+
+    return path
+
+
+def test_light_painting_stages_are_reused(drawing):
+    sweep = parameterSweep('lightPainting', drawing, {'order': [False, True], 'speed': [0.5, 1.0]},
+                           dims=DIMS, workers=1)
+    table = sweep.run()
+
+    # One contours stage, two orders, their waypoints and the stats of every point.
+    assert sweep.stats['stages'] == 1 + 2 + 2 + 4
+    assert (sweep.stats['run'], sweep.stats['reused']) == (9, 0)
+    assert len(table) == 4 and all(row['success'] and row['error'] is None for row in table)
+
+    # The time only depends on the speed, the waypoints and distance on the order.
+    for a in table:
+        for b in table:
+            if a['order'] == b['order']:
+                assert a['waypoints'] == b['waypoints'] and a['distance'] == pytest.approx(b['distance'])
+                if a['speed'] != b['speed']:
+                    assert a['time'] != b['time']
+
+    # A new speed only runs the stats of its two points, the rest come from the memo.
+    sweep.grid['speed'] = [0.5, 1.0, 2.0]
+    extended = sweep.run()
+    assert sweep.stats['stages'] == 1 + 2 + 2 + 6
+    assert (sweep.stats['run'], sweep.stats['reused']) == (2, 9)
+    assert [row for row in extended if row['speed'] != 2.0] == table
+
+
+def test_formation_stages_are_reused(drawing):
+    sweep = parameterSweep('multiDroneFormation', drawing, {'boxShape': [[0.3, 0.3, 0.3], [0.2, 0.2, 0.2]]},
+                           dims=DIMS, num_drones=6, workers=1)
+    table = sweep.run()
+
+    # The contours and clusters are shared, the separation, grid, assignment and transition are not.
+    assert sweep.stats['stages'] == 1 + 1 + 2*4
+    assert (sweep.stats['run'], sweep.stats['reused']) == (10, 0)
+    assert all(row['success'] and row['error'] is None for row in table)
+
+    # Every point is memoized.
+    sweep.run()
+    assert (sweep.stats['run'], sweep.stats['reused']) == (0, 10)
+
+
+def test_failures_propagate(tmp_path):
+    sweep = parameterSweep('lightPainting', str(tmp_path/'missing.png'), {'speed': [0.5, 1.0]},
+                           dims=DIMS, workers=1)
+    table = sweep.run()
+
+    # The contours fail once and every downstream stage carries the error without running.
+    assert sweep.stats['run'] == 1
+    assert all(not row['success'] and row['error'] for row in table)
+    assert table[0]['error'] == table[1]['error']
+
+
+def test_unknown_parameters():
+    with pytest.raises(ValueError):
+        parameterSweep('lightPainting', 'drawing.png', {'sped': [1.0]}, dims=DIMS)
+    with pytest.raises(ValueError):
+        parameterSweep('lightPainting', 'drawing.png', {'speed': [1.0]})
+    with pytest.raises(ValueError):
+        parameterSweep('swarm', 'drawing.png', {}, dims=DIMS)
@@ -0,0 +1,119 @@
+import json
+import os
+import socket
+import threading
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from crazyKhoreia.planningService import planningService, request
+
+DIMS = [[-1.5, -1.5, 0.0], [1.5, 1.5, 3.0]]
+TIMEOUT = 120
+
+
+def drawing(path):
+    img = np.full(shape=(300, 300, 3), fill_value=255, dtype=np.uint8)
+    cv.circle(img, (150, 150), 80, (0, 0, 0), 4)
+    cv.imwrite(str(path), img)
+
+    return str(path)
+
+
+def serve(workers=1):
+    # Run the service on a free port in a thread, as the daemon would.
+    service = planningService(port=0, workers=workers)
+    ready = threading.Event()
+
+    def target():
+        service.start()
+        ready.set()
+        service.serve_forever()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    assert ready.wait(TIMEOUT)
+
+    return service, thread
+
+
+def shutdown(service, thread):
+    assert list(request(dict(op='shutdown'), port=service.port, timeout=TIMEOUT)) == [dict(event='shutdown')]
+    thread.join(TIMEOUT)
+    assert not thread.is_alive()
+
+
+@pytest.fixture(scope='module')
+def service():
+    service, thread = serve()
+    yield service
+    shutdown(service, thread)
+
+
+def test_successful_job(service, tmp_path):
+    message = dict(op='run', id='paint', mode='lightPainting', in_path=drawing(tmp_path/'circle.png'),
+                   out_path=str(tmp_path), params=dict(dims=DIMS))
+    events = list(request(message, port=service.port, timeout=TIMEOUT))
+
+    # Accepted first, then the stage records in order, and the run summary last.
+    assert [e['id'] for e in events] == ['paint']*len(events)
+    assert events[0]['event'] == 'accepted' and events[-1]['event'] == 'done'
+    stages = [e['stage'] for e in events if e['event'] == 'stage']
+    assert stages[0] == 'read_image' and 'save' in stages
+    assert events[-1]['result']['waypoints'] > 0 and events[-1]['result']['wall'] > 0
+    assert os.path.exists(str(tmp_path/'circle_lp_wpts.csv'))
+
+
+@pytest.mark.parametrize('mode, name', [('lightPainting', 'missing.png'), ('swarm', 'circle.png')])
+def test_failing_job(service, tmp_path, mode, name):
+    drawing(tmp_path/'circle.png')
+    message = dict(op='run', id='broken', mode=mode, in_path=str(tmp_path/name), out_path=str(tmp_path),
+                   params=dict(dims=DIMS))
+    events = list(request(message, port=service.port, timeout=TIMEOUT))
+
+    # The error is reported with its traceback, after the records of the stages that ran, and the service
+    # keeps serving.
+    assert events[0]['event'] == 'accepted' and events[-1]['event'] == 'error'
+    assert all(e['event'] == 'stage' for e in events[1:-1])
+    assert events[-1]['id'] == 'broken' and 'Traceback' in events[-1]['traceback']
+    pong = list(request(dict(op='ping'), port=service.port, timeout=TIMEOUT))[-1]
+    assert pong['event'] == 'pong'
+
+
+def test_invalid_messages(service):
+    with socket.create_connection(('127.0.0.1', service.port), timeout=TIMEOUT) as sock:
+        sock.sendall(b'not json\n' + json.dumps(dict(op='fly')).encode() + b'\n')
+        with sock.makefile('r') as f:
+            events = [json.loads(f.readline()) for _ in range(2)]
+
+    assert events[0]['event'] == 'error' and events[0]['error'].startswith('Invalid message')
+    assert events[1]['event'] == 'error' and events[1]['error'] == 'Unknown op: fly'
+
+
+def test_shutdown_with_pending_jobs(tmp_path):
+    service, thread = serve(workers=1)
+    in_path = drawing(tmp_path/'circle.png')
+
+    # Three jobs queue on the single worker, then a shutdown and a late job arrive on the same connection.
+    with socket.create_connection(('127.0.0.1', service.port), timeout=TIMEOUT) as sock:
+        lines = [dict(op='run', id='job-' + str(k), mode='multiDroneFormation', in_path=in_path,
+                      out_path=str(tmp_path), params=dict(dims=DIMS, boxShape=[0.3, 0.3, 0.3], num_drones=10))
+                 for k in range(3)]
+        lines += [dict(op='shutdown'), dict(op='run', id='late', mode='lightPainting', in_path=in_path,
+                                             out_path=str(tmp_path), params=dict(dims=DIMS))]
+        sock.sendall(''.join(json.dumps(line) + '\n' for line in lines).encode())
+
+        # The service closes the connection once every accepted job has reported.
+        with sock.makefile('r') as f:
+            events = [json.loads(line) for line in f]
+    thread.join(TIMEOUT)
+    assert not thread.is_alive()
+
+    # The queued jobs still run and report, the late one is refused.
+    final = {e['id']: e for e in events if e['event'] in ('done', 'error')}
+    assert [e for e in events if e['event'] == 'shutdown'] == [dict(event='shutdown')]
+    assert sum(e['event'] == 'accepted' for e in events) == 3
+    assert all(final['job-' + str(k)]['event'] == 'done' for k in range(3))
+    assert final['late']['error'] == 'Service shutting down.'
+    assert service.jobs == {} and service.completed == 3 and service.executor is None
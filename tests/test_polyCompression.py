@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from crazyKhoreia.polyCompression import FIT_RATE, SEGMENT, compress, evaluate, mockLink, pack, unpack
+from crazyKhoreia.trajectory import trajectory
+
+TOLERANCE = 0.01
+
+
+def painting(seed, num_points=200):
+    # A wobbly spiral drawn in strokes, the LED switches off between them.
+    rng = np.random.default_rng(seed)
+    angle = np.linspace(0, 6*np.pi, num_points)
+    radius = 0.3 + 0.1*angle + rng.uniform(-0.02, 0.02, size=num_points)
+    points = np.column_stack([np.zeros(num_points), radius*np.cos(angle), 1.5 + radius*np.sin(angle)])
+    led = (np.arange(num_points)//25) % 3 != 2
+
+    return trajectory(points, speed=1.0, accel=1.0, led=led)
+
+
+def fit_times(traj):
+    # The samples compress() fits and measures, see compress().
+    return np.union1d(np.linspace(0.0, traj.duration, int(np.ceil(traj.duration*FIT_RATE)) + 1), traj.t)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compress_is_within_tolerance(seed):
+    traj = painting(seed)
+    segments = compress(traj, TOLERANCE)
+
+    # Within the tolerance on the fitted samples, and continuous at every segment boundary.
+    t = fit_times(traj)
+    pos, _, led = traj.sample(t)
+    fitted, fitted_led = evaluate(segments, t)
+    assert np.max(np.linalg.norm(fitted - pos, axis=1)) <= TOLERANCE + 1e-6
+    assert np.isclose(sum(s[0] for s in segments), traj.duration)
+    assert len(segments) < len(traj.points)
+
+    # Segments never span an LED change, so the LED state matches away from the switching instants.
+    steady = np.concatenate([[True], led[1:] == led[:-1]]) & np.concatenate([led[:-1] == led[1:], [True]])
+    assert np.array_equal(fitted_led[steady], led[steady].astype(np.uint8))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pack_unpack_round_trip(seed):
+    segments = compress(painting(seed), TOLERANCE)
+    data = pack(segments)
+    assert len(data) == SEGMENT.size*len(segments)
+
+    # Durations, float32 coefficients and LED states come back exactly, yaw is dropped.
+    restored = unpack(data)
+    assert len(restored) == len(segments)
+    for (duration, coeffs, led), (duration2, coeffs2, led2) in zip(segments, restored):
+        assert duration2 == duration and led2 == led
+        assert coeffs2.dtype == np.float32 and np.array_equal(coeffs2, coeffs)
+    assert pack(restored) == data
+
+
+def test_unpacked_segments_evaluate_the_same():
+    # A long painting of short segments, where float32 durations would drift the segment start times.
+    traj = painting(0, num_points=2000)
+    segments = compress(traj, TOLERANCE)
+    restored = unpack(pack(segments))
+
+    t = np.linspace(0.0, traj.duration, 5000)
+    pos, led = evaluate(segments, t)
+    pos2, led2 = evaluate(restored, t)
+    assert np.array_equal(pos, pos2) and np.array_equal(led, led2)
+    assert abs(sum(s[0] for s in restored) - traj.duration) < 1e-9
+
+
+@pytest.mark.parametrize('loss, corrupt', [(0.0, 0.0), (0.3, 0.0), (0.0, 0.3), (0.2, 0.2)])
+def test_mock_link_delivers_intact_payloads(loss, corrupt):
+    data = pack(compress(painting(0), TOLERANCE))
+    link = mockLink(loss=loss, corrupt=corrupt, seed=1)
+    stats = link.upload(3, data)
+
+    # Lost and corrupted packets are all sent again, the UAV always ends up with the exact payload.
+    assert link.memory[3] == data
+    assert stats['packets'] == -(-len(data)//link.payload)
+    assert stats['retries'] >= stats['corrupted']
+    assert (stats['retries'] > 0) == (loss > 0 or corrupt > 0)
+    assert (stats['corrupted'] > 0) == (corrupt > 0)
+    assert stats['airtime'] == pytest.approx((stats['packets'] + stats['retries'])/link.packet_rate)
+
+
+def test_upload_swarm_totals():
+    payloads = [bytes(range(k, k + 100)) for k in range(4)]
+    link = mockLink(corrupt=0.5, seed=2)
+    total = link.upload_swarm(payloads)
+
+    assert [link.memory[uav] for uav in range(4)] == payloads
+    assert total['uavs'] == 4 and total['bytes'] == 400
+    assert total['corrupted'] == sum(s['corrupted'] for s in link.log) > 0
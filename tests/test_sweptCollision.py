@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from crazyKhoreia._sweptCollision import closest_approach, pair_conflicts, swept_pairs
+
+BOX_SHAPE = np.array([0.3, 0.3, 0.4])
+
+
+def random_transition(seed, num_drones=8):
+    # Crowded random paths with random start delays, so most pairs come close at some point.
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(-0.6, 0.6, size=(num_drones, 3))
+    end = rng.uniform(-0.6, 0.6, size=(num_drones, 3))
+    delays = rng.choice([0.0, 0.25, 0.5, 1.0], size=num_drones)
+
+    return start, end, delays
+
+
+def sampled_relative(start, end, delays, duration, i, j, t):
+    # Relative position of every pair (i[k], j[k]) at the times t, shape (len(t), len(i), 3).
+    ui = np.clip((t[:, None] - delays[i])/duration, 0, 1)[:, :, None]
+    uj = np.clip((t[:, None] - delays[j])/duration, 0, 1)[:, :, None]
+
+    return (start[i] + ui*(end[i] - start[i])) - (start[j] + uj*(end[j] - start[j]))
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('duration', [1.0, 2.5])
+def test_pair_conflicts_matches_sampling(seed, duration):
+    start, end, delays = random_transition(seed)
+    i, j = np.triu_indices(len(start), 1)
+    times = pair_conflicts(start, end, BOX_SHAPE, i, j, delays[i], delays[j], duration)
+
+    t = np.linspace(0, np.max(delays) + duration, 4001)
+    d = sampled_relative(start, end, delays, duration, i, j, t)
+    overlap = np.all(np.abs(d) < BOX_SHAPE, axis=2)
+    sampled = np.any(overlap, axis=0)
+
+    # Every sampled overlap is found, and no later than the first overlapping sample.
+    assert np.all(np.isfinite(times[sampled]))
+    first = t[np.argmax(overlap, axis=0)]
+    assert np.all(times[sampled] <= first[sampled] + 1e-9)
+
+    # Every reported conflict starts at a touching configuration.
+    hit = np.isfinite(times)
+    assert np.any(hit)
+    for k in np.flatnonzero(hit):
+        rel = sampled_relative(start, end, delays, duration, i[k:k + 1], j[k:k + 1],
+                               np.array([times[k]]))[0, 0]
+        assert np.all(np.abs(rel) <= BOX_SHAPE + 1e-9)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_swept_pairs_keeps_every_conflict(seed):
+    start, end, delays = random_transition(seed, num_drones=30)
+    conflicts, _ = closest_approach(start, end, BOX_SHAPE, delays)
+
+    i, j = np.triu_indices(len(start), 1)
+    times = pair_conflicts(start, end, BOX_SHAPE, i, j, delays[i], delays[j], 1.0)
+    expected = np.column_stack([i, j])[np.isfinite(times)]
+
+    pairs = {tuple(p) for p in swept_pairs(start, end, BOX_SHAPE)}
+    assert {tuple(p) for p in expected} <= pairs
+    assert {tuple(p) for p in conflicts} == {tuple(p) for p in expected}
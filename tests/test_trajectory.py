@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+import pytest
+
+from crazyKhoreia._sweptCollision import stagger_delays
+from crazyKhoreia.trajectory import swarm_setpoints, trajectory
+
+BOX_SHAPE = np.array([0.3, 0.3, 0.3])
+NUM_DRONES = 6
+
+
+def staggered_transitions(num_cases):
+    # Take offs from a ground grid to a shuffled copy of it at random heights, keeping the ones whose
+    # conflicts are all resolved by start delays.
+    x, y = np.meshgrid([-0.6, 0.0, 0.6], [-0.3, 0.3])
+    start = np.column_stack([x.ravel(), y.ravel(), np.zeros(NUM_DRONES)])
+    cases = []
+    for seed in range(1000):
+        rng = np.random.default_rng(seed)
+        end = np.column_stack([rng.permutation(start[:, 0:2]), rng.uniform(0.5, 1.0, size=NUM_DRONES)])
+        delays, conflicts, _ = stagger_delays(start, end, BOX_SHAPE)
+        if np.any(delays) and len(conflicts) == 0:
+            cases.append((start, end, delays))
+        if len(cases) == num_cases:
+            break
+
+    return cases
+
+
+@pytest.mark.parametrize('start, end, delays', staggered_transitions(20))
+@pytest.mark.parametrize('rate, speed, accel', [(50, 1.0, 1.0), (33, 0.5, 2.0)])
+def test_swarm_setpoints_keep_the_checked_geometry(start, end, delays, rate, speed, accel):
+    f = io.StringIO()
+    duration = swarm_setpoints(f, start, end, rate, speed, accel, delays)
+    rows = np.loadtxt(io.StringIO(f.getvalue()), delimiter=',')
+
+    # One row per UAV and time, without repeated times, from the start to the end positions.
+    t = np.unique(rows[:, 0])
+    assert len(t)*NUM_DRONES == len(rows)
+    assert t[-1] == pytest.approx(duration, abs=1e-4)
+    pos = rows[:, 2:5].reshape(len(t), NUM_DRONES, 3)
+    assert np.allclose(pos[0], start, atol=1e-6) and np.allclose(pos[-1], end, atol=1e-6)
+
+    # No two boxes overlap at any setpoint, as stagger_delays() reported, up to the written precision
+    # (boxes may touch).
+    diff = np.abs(pos[:, :, None] - pos[:, None, :])
+    overlap = np.all(diff < BOX_SHAPE - 1e-5, axis=3)
+    overlap[:, np.arange(NUM_DRONES), np.arange(NUM_DRONES)] = False
+    assert not np.any(overlap)
+
+    # Every UAV starts and ends at rest, within the velocity and acceleration limits.
+    vel = rows[:, 5:8].reshape(len(t), NUM_DRONES, 3)
+    assert np.allclose(vel[0], 0) and np.allclose(vel[-1], 0)
+    assert np.max(np.linalg.norm(vel, axis=2)) <= speed + 1e-6
+    # Times and velocities are written with 4 and 6 decimals.
+    dv = np.linalg.norm(np.diff(vel, axis=0), axis=2)
+    assert np.all(dv <= accel*(np.diff(t)[:, None] + 1e-4) + 4e-6)
+
+
+@pytest.mark.parametrize('rate, speed, accel', [(100, 1.0, 1.0), (50, 2.0, 3.0)])
+def test_trajectory_bounds_the_corners(rate, speed, accel):
+    # Zigzag with right angles, a reversal and gentle corners.
+    points = [[0, 0, 0], [0, 1, 0], [0, 1, 1], [0, 0, 1], [0, 0.5, 1], [0, 1.5, 1.2], [0, 2.5, 1.5]]
+    traj = trajectory(points, speed, accel, rate=rate)
+
+    # At each corner the velocity changes direction at once, by at most accel over one setpoint period.
+    turn = np.linalg.norm(traj.u[1:] - traj.u[:-1], axis=1)
+    assert np.all(traj.v[1:-1]*turn <= accel/rate + 1e-9)
+
+    f = io.StringIO()
+    traj.write(f, rate)
+    rows = np.loadtxt(io.StringIO(f.getvalue()), delimiter=',')
+    t, vel = rows[:, 0], rows[:, 4:7]
+    assert np.max(np.linalg.norm(vel, axis=1)) <= speed + 1e-6
+
+    # Along the path within accel, plus a corner's change of direction, up to the written precision.
+    dv = np.linalg.norm(np.diff(vel, axis=0), axis=1)
+    assert np.all(dv <= 2*accel*(np.diff(t) + 1e-4) + 4e-6)